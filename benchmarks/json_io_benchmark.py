@@ -0,0 +1,69 @@
+"""Compares stdlib `json` with orjson in `utils.json_io` on .xcstrings catalogs.
+
+    python3 benchmarks/json_io_benchmark.py [catalog.xcstrings ...] [--keys 5000] [--repeat 5]
+
+Without files a catalog with `--keys` plural and plain entries in 10 languages is generated.
+"""
+import argparse, json, os, sys, time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import json_io
+
+LANGS = ["en", "de", "fr", "ru", "ja", "zh-Hans", "ar", "pt-BR", "uk", "hi"]
+
+def generate_catalog(keys: int) -> dict:
+    strings = dict()
+    for idx in range(keys):
+        unit = lambda lang: {"stringUnit": {"state": "translated", "value": f"Текст {idx} «{lang}» %@ ✓"}}
+        if idx % 5 == 0:
+            localizations = {lang: {"variations": {"plural": {"one": unit(lang), "other": unit(lang)}}} for lang in LANGS}
+        else:
+            localizations = {lang: unit(lang) for lang in LANGS}
+        strings[f"key_{idx}"] = {"comment": f"Screen {idx % 40} \"title\"", "localizations": localizations}
+    return {"sourceLanguage": "en", "strings": strings, "version": "1.0"}
+
+def best_time(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def run(name: str, text: str, repeat: int):
+    orjson = json_io.orjson
+    data = json.loads(text)
+    results = dict()
+    for backend in (["stdlib", "orjson"] if orjson else ["stdlib"]):
+        json_io.orjson = orjson if backend == "orjson" else None
+        results[backend] = (
+            best_time(lambda: json_io.loads(text), repeat),
+            best_time(lambda: json_io.dumps_xcode(data), repeat),
+            best_time(lambda: json_io.dumps_compact(data), repeat),
+            json_io.dumps_xcode(data),
+        )
+    json_io.orjson = orjson
+    print(f"{name}: {len(text) / 1e6:.1f} MB")
+    for (backend, (load_time, xcode_time, compact_time, _)) in results.items():
+        print(f"  {backend:7} load {load_time * 1000:8.1f} ms   dumps_xcode {xcode_time * 1000:8.1f} ms   dumps_compact {compact_time * 1000:8.1f} ms")
+    if "orjson" in results:
+        identical = results["orjson"][3] == results["stdlib"][3]
+        print(f"  dumps_xcode output is {'identical' if identical else 'DIFFERENT'}")
+
+def main():
+    parser = argparse.ArgumentParser(description="stdlib json vs orjson")
+    parser.add_argument("files", nargs="*")
+    parser.add_argument("--keys", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    if json_io.orjson is None:
+        print("orjson is not installed, only stdlib is measured")
+    if args.files:
+        for path in args.files:
+            with open(path, encoding="utf-8") as f:
+                run(path, f.read(), args.repeat)
+    else:
+        catalog = generate_catalog(args.keys)
+        run(f"generated {args.keys} keys", json.dumps(catalog, indent=2, ensure_ascii=False, separators=(',', ' : '), sort_keys=True), args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Compares loading of many catalogs: the old double parse, where files were parsed sequentially
+and parsed again for language detection, against one parallel pass of `load_catalogs`.
+
+    python3 benchmarks/load_benchmark.py [--files 200] [--keys 300] [--workers 8] [--repeat 3]
+
+Catalogs are generated in a temporary directory.
+"""
+import argparse, os, sys, tempfile, time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import json_io
+from localize_strings import load_catalogs, extract_languages, save
+
+LANGS = ["en", "de", "fr", "ru", "ja", "zh-Hans", "ar", "pt-BR", "uk", "hi"]
+
+def generate_catalog(file_idx: int, keys: int) -> dict:
+    strings = dict()
+    for idx in range(keys):
+        # every file misses some translations, like catalogs in the middle of localization
+        langs = LANGS[:len(LANGS) - (idx + file_idx) % 4]
+        unit = lambda lang: {"stringUnit": {"state": "translated", "value": f"Text {file_idx}.{idx} «{lang}» %@"}}
+        strings[f"key_{file_idx}_{idx}"] = {"comment": f"Screen {idx % 40}", "localizations": {lang: unit(lang) for lang in langs}}
+    return {"sourceLanguage": "en", "strings": strings, "version": "1.0"}
+
+def double_parse(paths: list):
+    """Loading before `load_catalogs`: every file is parsed for translation, and once more for language detection"""
+    catalogs = [json_io.load(path) for path in paths]
+    all_languages = set()
+    source_language = None
+    for path in paths:
+        data = json_io.load(path)
+        if "sourceLanguage" in data and source_language is None:
+            source_language = data["sourceLanguage"]
+        for value in data.get("strings", {}).values():
+            all_languages.update(value.get("localizations", {}).keys())
+    return catalogs, (list(all_languages), source_language)
+
+def single_pass(paths: list, workers: int):
+    catalogs, scans = load_catalogs(paths, workers)
+    return catalogs, extract_languages(scans)
+
+def best_time(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="Double parse vs single parallel pass of catalog loading")
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--keys", type=int, default=300, help="Keys in every catalog")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = [os.path.join(tmp_dir, f"Localizable_{idx}.xcstrings") for idx in range(args.files)]
+        for (idx, path) in enumerate(paths):
+            save(path, generate_catalog(idx, args.keys))
+        size = sum(os.path.getsize(path) for path in paths)
+        old_catalogs, (old_langs, old_source) = double_parse(paths)
+        new_catalogs, (new_langs, new_source) = single_pass(paths, args.workers)
+        same = old_catalogs == new_catalogs and sorted(old_langs) == sorted(new_langs) and old_source == new_source
+        print(f"{args.files} files, {size / 1e6:.1f} MB, {args.workers} workers, orjson {'on' if json_io.orjson else 'off'}")
+        double = best_time(lambda: double_parse(paths), args.repeat)
+        single = best_time(lambda: single_pass(paths, args.workers), args.repeat)
+        print(f"double parse   {double * 1000:8.0f} ms")
+        print(f"load_catalogs  {single * 1000:8.0f} ms   {double / single:.2f}x")
+        print(f"catalogs and languages are {'identical' if same else 'DIFFERENT'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""Measures startup time of the scripts: `--help` run, which never needs the heavy modules,
+against the same run with openai, tiktoken and tqdm imported eagerly, as before lazy imports.
+
+    python3 benchmarks/startup_benchmark.py [--repeat 5]
+"""
+import argparse, os, subprocess, sys, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS = ["localize_strings.py", "localize_metadata.py", "localize_release_notes.py"]
+HEAVY_MODULES = ["openai", "tiktoken", "tqdm", "utils.languages"]
+
+def best_time(command: list, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def eager_command(script: str) -> list:
+    # imports which failed are skipped, missing module only makes eager run faster
+    imports = "".join(f"\ntry: import {module}\nexcept ImportError: pass" for module in HEAVY_MODULES)
+    code = f"import runpy, sys{imports}\nsys.argv = ['{script}', '--help']\nrunpy.run_path('{script}', run_name='__main__')"
+    return [sys.executable, "-c", code]
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup time of scripts with lazy and eager imports")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    baseline = best_time([sys.executable, "-c", "pass"], args.repeat)
+    print(f"python interpreter: {baseline * 1000:.0f} ms")
+    for script in SCRIPTS:
+        lazy = best_time([sys.executable, script, "--help"], args.repeat)
+        eager = best_time(eager_command(script), args.repeat)
+        print(f"{script:28} lazy {lazy * 1000:6.0f} ms   eager {eager * 1000:6.0f} ms   saved {(eager - lazy) * 1000:6.0f} ms")
+
+if __name__ == "__main__":
+    main()
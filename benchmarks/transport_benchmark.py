@@ -0,0 +1,74 @@
+"""Compares HTTP clients against a local fake API server with a response delay:
+a new client per request, one default httpx client, and `SharedTransport` pool.
+Connections are counted by the server.
+
+    python3 benchmarks/transport_benchmark.py [--requests 200] [--workers 8] [--delay 0.05]
+"""
+import argparse, concurrent.futures, http.server, os, sys, threading, time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.transport import SharedTransport
+
+class FakeAPIHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive
+    body = b'{"choices":[{"message":{"content":"{}"}}]}'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.server.delay)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+def start_server(delay: float):
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), FakeAPIHandler)
+    server.daemon_threads = True
+    server.delay = delay
+    server.connections = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def run(server, name: str, post, requests: int, workers: int):
+    server.connections = 0
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(lambda _: post(), range(requests)))
+    seconds = time.perf_counter() - start
+    print(f"{name:26} {seconds:6.2f} s   {requests / seconds:7.1f} req/s   {server.connections:4} connections")
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP connection pooling against a local fake server")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--delay", type=float, default=0.05, help="Server response delay, seconds")
+    args = parser.parse_args()
+    import httpx
+    server = start_server(args.delay)
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+    payload = b'{"model":"gpt-4.1","messages":[]}'
+
+    def new_client_post():
+        with httpx.Client() as client:
+            client.post(url, content=payload)
+    default_client = httpx.Client()
+    transport = SharedTransport(args.workers)
+
+    print(f"{args.requests} requests, {args.workers} workers, {args.delay * 1000:.0f} ms server delay")
+    run(server, "new client per request", new_client_post, args.requests, args.workers)
+    run(server, "default httpx client", lambda: default_client.post(url, content=payload), args.requests, args.workers)
+    run(server, "shared transport", lambda: transport.client.post(url, content=payload), args.requests, args.workers)
+    print(f"shared transport: {transport.description()}")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import json, argparse, os, sys, stat, socket, socketserver, contextlib, importlib
+from utils.tokenizer import load_encoding
+
+DEFAULT_SOCKET = "/tmp/ios_app_localizer.sock"
+JOBS = ["strings", "metadata", "release_notes"]
+
+class SocketWriter:
+    """File-like object, which sends everything written to the client as JSON lines"""
+    def __init__(self, wfile):
+        self.wfile = wfile
+
+    def write(self, text):
+        if text:
+            self.wfile.write((json.dumps({"out": text}, ensure_ascii=False) + "\n").encode("utf-8"))
+        return len(text)
+
+    def flush(self):
+        self.wfile.flush()
+
+    def isatty(self):
+        return False
+
+class GPTPool:
+    """Keeps `GPTWrapper` instances (with clients, tokenizer and cache) alive between jobs, all of them share one tokenizer"""
+    def __init__(self, cache_entries: int, encoding):
+        from utils.gpt_utils import GPTWrapper, ResponseCache
+        self.wrapper_class = GPTWrapper
+        self.cache_class = ResponseCache
+        self.cache_entries = cache_entries
+        self.encoding = encoding
+        self.wrappers = dict()
+
+    def __call__(self, **kwargs):
+        key = json.dumps(kwargs, sort_keys=True, default=str)
+        if key not in self.wrappers:
+            gpt = self.wrapper_class(**kwargs)
+            gpt.cache = self.cache_class(self.cache_entries)
+            gpt._enc = self.encoding
+            self.wrappers[key] = gpt
+        gpt = self.wrappers[key]
+        gpt.reset_usage()
+        return gpt
+
+def load_job_modules():
+    # scripts import heavy modules lazily, warm them up once on start
+    for module in ("openai", "tqdm.auto"):
+        importlib.import_module(module)
+    import localize_strings, localize_metadata, localize_release_notes
+    return {
+        "strings": localize_strings.main,
+        "metadata": localize_metadata.main,
+        "release_notes": localize_release_notes.main,
+    }
+
+class JobHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        writer = SocketWriter(self.wfile)
+        try:
+            request = json.loads(self.rfile.readline().decode("utf-8"))
+            job_main = self.server.jobs[request["job"]]
+        except (ValueError, KeyError, TypeError) as e:
+            writer.write(f"Malformed request: {e!r}\n")
+            self.reply_exit(2)
+            return
+        exit_code = 0
+        prev_cwd = os.getcwd()
+        try:
+            os.chdir(request.get("cwd", prev_cwd))
+            with contextlib.redirect_stdout(writer), contextlib.redirect_stderr(writer):
+                job_main(request.get("argv", []), gpt_factory=self.server.gpt_pool)
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except Exception as e:
+            writer.write(f"Error: {e}\n")
+            exit_code = 1
+        finally:
+            os.chdir(prev_cwd)
+        self.reply_exit(exit_code)
+
+    def reply_exit(self, exit_code: int):
+        self.wfile.write((json.dumps({"exit": exit_code}) + "\n").encode("utf-8"))
+
+class LocalizerServer(socketserver.UnixStreamServer):
+    # jobs are handled one by one, because stdout redirection is global
+
+    def __init__(self, socket_path, cache_entries):
+        self.jobs = load_job_modules()
+        self.gpt_pool = GPTPool(cache_entries, load_encoding())
+        super().__init__(socket_path, JobHandler)
+
+def remove_stale_socket(socket_path) -> bool:
+    """Removes socket left by a daemon which was killed. Returns False if the path is used by a running daemon or isn't a socket"""
+    if not os.path.lexists(socket_path):
+        return True
+    if not stat.S_ISSOCK(os.lstat(socket_path).st_mode):
+        return False
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.remove(socket_path)
+            return True
+    return False
+
+def serve(socket_path, cache_entries):
+    if not remove_stale_socket(socket_path):
+        print(f"{socket_path} is used by a running daemon or is not a socket")
+        exit(1)
+    with LocalizerServer(socket_path, cache_entries) as server:
+        print(f"Localization daemon is listening on {socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(socket_path)
+
+def run_job(socket_path, job, argv) -> int:
+    if job == "release_notes" and "--notes" not in argv:
+        # interactive input should happen on client side
+        from localize_release_notes import parse_input
+        argv = argv + ["--notes", parse_input()]
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        request = {"job": job, "argv": argv, "cwd": os.getcwd()}
+        sock.sendall((json.dumps(request, ensure_ascii=False) + "\n").encode("utf-8"))
+        for line in sock.makefile("r", encoding="utf-8"):
+            message = json.loads(line)
+            if "out" in message:
+                sys.stdout.write(message["out"])
+                sys.stdout.flush()
+            elif "exit" in message:
+                return message["exit"]
+    print("Connection with daemon was closed unexpectedly")
+    return 1
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Long-lived localization daemon. Keeps GPT clients, tokenizer and translations cache warm between runs.')
+
+    parser.add_argument('--socket',
+                        type=str,
+                        default=DEFAULT_SOCKET,
+                        help=f'Unix socket path, default: {DEFAULT_SOCKET}')
+
+    parser.add_argument('--cache_entries',
+                        type=int,
+                        default=10000,
+                        help='Responses kept in memory cache of every model, least recently used are dropped (default: 10000)')
+
+    parser.add_argument('job',
+                        choices=["serve"] + JOBS,
+                        help='`serve` to start daemon, or job name to run with the same arguments as the job script')
+
+    parser.add_argument('job_args',
+                        nargs=argparse.REMAINDER,
+                        help='Arguments passed to the job script')
+
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+    if args.job == "serve":
+        serve(args.socket, args.cache_entries)
+    else:
+        exit(run_job(args.socket, args.job, args.job_args))
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,16 @@
-from openai import OpenAI
-import json, argparse, os
+import json, argparse, os, re, hashlib, difflib
 from os.path import join
-from tqdm import tqdm
-from utils.gpt_utils import gpt_models, GPTWrapper
-from utils.languages import LANGUAGES, COUNTRIES
+from utils.gpt_utils import gpt_models, structured_output_models, GPTWrapper
 from utils.metadata import get_exceed_fields, print_exceed_fields
+from utils.profiling import PROFILER, profiled, add_profile_arguments, start_profiling
+from utils.cassette import add_cassette_arguments, create_cassette
+from utils.transport import add_transport_arguments, create_transport
+from utils.structured import translation_schema
+from utils.variants import adapt_prompt, request_adaptation, merge_adapted, add_variant_arguments, create_variants
 import shutil
 
 def get_language(code: str) -> str:
+    from utils.languages import LANGUAGES, COUNTRIES
     try:
         language_code, region_code = code.split('-')
     except ValueError:
@@ -48,6 +51,7 @@ JSON Output:
     return prompt
 
 
+@profiled("load")
 def read_metadata(metadata_path: str, fields: list, src_langs: list, dst_lang: str):
     result = dict()
     for field in fields:
@@ -60,6 +64,7 @@ def read_metadata(metadata_path: str, fields: list, src_langs: list, dst_lang: s
         result[field] = field_values
     return result
 
+@profiled("save")
 def update_metadata(metadata_path: str, fields: list, dst_lang: str, result: dict):
     os.makedirs(join(metadata_path, dst_lang), exist_ok=True)
     for field in fields:
@@ -79,7 +84,112 @@ def update_metadata(metadata_path: str, fields: list, dst_lang: str, result: dic
         open(dst_path, "w").write(text+"\n")
 
 
-def parse_arguments():
+PARAGRAPH_SEPARATOR_RE = re.compile(r"\n\s*\n")
+
+def split_paragraphs(text: str) -> list:
+    return PARAGRAPH_SEPARATOR_RE.split(text.strip())
+
+def paragraph_fingerprint(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def load_state(state_path: str) -> dict:
+    """Source paragraph fingerprints of translated fields: {dst_lang: {field: [fingerprint, ...]}}"""
+    if not os.path.exists(state_path):
+        return dict()
+    with open(state_path) as f:
+        return json.load(f)
+
+def save_state(state_path: str, state: dict):
+    with open(state_path, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+
+@profiled("load")
+def read_changed_paragraphs(metadata_path: str, fields: list, src_langs: list, dst_lang: str, lang_state: dict):
+    """Returns paragraphs to translate like `read_metadata`, and plan of every field: 
+    (source fingerprints, translated paragraphs with None for changed ones).
+    Unchanged paragraphs are taken from existing translation, if it was made from known source.
+    """
+    data = dict()
+    plans = dict()
+    for field in fields:
+        sources = dict()
+        for src_lang in src_langs:
+            with open(join(metadata_path, src_lang, field+".txt")) as f:
+                sources[src_lang] = split_paragraphs(f.read())
+        primary = sources[src_langs[0]]
+        fingerprints = [paragraph_fingerprint(paragraph) for paragraph in primary]
+        translated = [None] * len(primary)
+
+        old_fingerprints = lang_state.get(field)
+        dst_path = join(metadata_path, dst_lang, field+".txt")
+        if old_fingerprints and os.path.exists(dst_path):
+            with open(dst_path) as f:
+                existing = split_paragraphs(f.read())
+            # translation edited by hand can't be matched to source paragraphs, it's translated again
+            if len(existing) == len(old_fingerprints):
+                matcher = difflib.SequenceMatcher(a=old_fingerprints, b=fingerprints, autojunk=False)
+                for (old_idx, new_idx, size) in matcher.get_matching_blocks():
+                    translated[new_idx:new_idx+size] = existing[old_idx:old_idx+size]
+
+        for (idx, paragraph) in enumerate(primary):
+            if translated[idx] is not None: continue
+            key = field if len(primary) == 1 else f"{field}_{idx+1}"
+            # other sources are added only if they have the same paragraphs
+            data[key] = {lang: paragraphs[idx] for (lang, paragraphs) in sources.items() if len(paragraphs) == len(primary)}
+            data[key][dst_lang] = None
+        plans[field] = (fingerprints, translated)
+    return data, plans
+
+def merge_paragraphs(plans: dict, result: dict, dst_lang: str, lang_state: dict):
+    """Returns (result like `process_json` for changed fields, changed fields). 
+    Fingerprints of complete fields are saved to `lang_state`
+    """
+    merged = dict()
+    for (field, (fingerprints, translated)) in plans.items():
+        if all(paragraph is not None for paragraph in translated):
+            lang_state[field] = fingerprints # nothing changed
+            continue
+        paragraphs = []
+        for (idx, paragraph) in enumerate(translated):
+            key = field if len(translated) == 1 else f"{field}_{idx+1}"
+            if paragraph is None:
+                paragraph = result.get(key, {}).get(dst_lang)
+            if paragraph is None:
+                print(f"WARN!! No {dst_lang} inside responce result in {key}")
+                break
+            paragraphs.append(paragraph.strip())
+        else:
+            merged[field] = {dst_lang: "\n\n".join(paragraphs)}
+            lang_state[field] = fingerprints
+    return merged, list(merged)
+
+def derive_variant(gpt: GPTWrapper, metadata_path: str, fields: list, variant: str, variants, lang_state = None):
+    """Returns (result like `process_json`, derived fields) of regional variant, made from texts of its base language.
+    With `lang_state` of --incremental only fields with changed base text are derived
+    """
+    base = variants.base(variant)
+    base_texts = dict()
+    for field in fields:
+        base_path = join(metadata_path, base, field+".txt")
+        if not os.path.exists(base_path): continue
+        with open(base_path) as f:
+            text = f.read().rstrip()
+        if lang_state is not None:
+            fingerprints = [paragraph_fingerprint(text)]
+            if lang_state.get(field) == fingerprints and os.path.exists(join(metadata_path, variant, field+".txt")): continue
+            lang_state[field] = fingerprints
+        base_texts[field] = text
+    
+    adapted = dict()
+    if base_texts and not variants.is_copy(variant):
+        prompt = adapt_prompt(get_language(base), get_language(variant), ' Keep "name" and "subtitle" under 30 characters, and "keywords" under 100 characters.')
+        with PROFILER.stage("translate"):
+            adapted = request_adaptation(gpt, prompt, base_texts)
+    # skipped fields are the same as the base
+    result = {field: {variant: merge_adapted(text, adapted.get(field))} for (field, text) in base_texts.items()}
+    return result, list(result)
+
+def parse_arguments(argv=None):
     parser = argparse.ArgumentParser(description='Python script localize your application powered with GPT.')
     
     parser.add_argument('--gpt_api_key',
@@ -122,12 +232,44 @@ def parse_arguments():
                         type=str,
                         help='Array of language codes like "ru,en-US,de-DE"')
     
-    return parser.parse_args()
+    parser.add_argument('--stream',
+                        action='store_true',
+                        default=False,
+                        help='Stream responses: entries are parsed while they arrive, and only missing ones are requested again if response is cut off')
+
+    parser.add_argument('--structured_outputs',
+                        action='store_true',
+                        default=False,
+                        help='Constrain responses with strict JSON schema of expected keys, languages and plural forms (gpt-4o-mini, gpt-4.1 models)')
+
+    parser.add_argument('--incremental',
+                        action='store_true',
+                        default=False,
+                        help='Translate only paragraphs changed since the last run, unchanged ones are kept from existing translation')
 
-def main():
-    args = parse_arguments()
-    gpt = GPTWrapper(api_key=args.gpt_api_key, model=args.gpt_model)
+    parser.add_argument('--state_file',
+                        type=str,
+                        default=None,
+                        help='Source fingerprints of the last run for --incremental, default is .localize_metadata_state.json inside --fastlane_meta_path')
+
+    add_profile_arguments(parser)
+    add_cassette_arguments(parser)
+    add_transport_arguments(parser)
+    add_variant_arguments(parser)
+
+    return parser.parse_args(argv)
+
+def main(argv=None, gpt_factory=GPTWrapper):
+    args = parse_arguments(argv)
+    start_profiling(args)
+    gpt = gpt_factory(api_key=args.gpt_api_key, model=args.gpt_model)
     if not gpt: exit
+    gpt.stream = args.stream
+    gpt.cassette = create_cassette(args)
+    gpt.transport = create_transport(args, gpt.max_workers)
+    gpt.response_schema = translation_schema if args.structured_outputs else None
+    if args.structured_outputs and gpt.model not in structured_output_models:
+        print(f"{gpt.model} doesn't support structured outputs, plain JSON object is requested")
 
     src_langs = args.localize_from.split(",")
     fields = args.fields.split(",")
@@ -135,22 +277,53 @@ def main():
     dst_langs = args.localize_to.split(",")
     meta_path = args.fastlane_meta_path
 
-    pbar = tqdm(dst_langs)
+    state_path = args.state_file or join(meta_path, ".localize_metadata_state.json")
+    state = load_state(state_path) if args.incremental else None
+
+    # variants go after their base languages
+    dst_langs = [lang for lang in dst_langs if lang not in src_langs]
+    variants = create_variants(args)
+    variant_langs = []
+    if variants:
+        dst_langs, variant_langs = variants.split(dst_langs, variants.base_languages(src_langs, dst_langs))
+        if variant_langs:
+            print(f"Regional variants: {variants.description()}")
+
+    from tqdm import tqdm
+    pbar = tqdm(dst_langs + variant_langs)
     exceed_fields = []
     for dst_lang in pbar:
-        if dst_lang in src_langs: continue
         pbar.set_description(f"Processing language {dst_lang}")
-        data = read_metadata(meta_path, fields, src_langs, dst_lang)
         prompt = generate_prompt(dst_lang, args.force_app_name)
-        result_dict = gpt.process_json(prompt, data)
+        if dst_lang in variant_langs:
+            lang_state = state.setdefault(dst_lang, dict()) if args.incremental else None
+            result_dict, changed_fields = derive_variant(gpt, meta_path, fields, dst_lang, variants, lang_state)
+        elif args.incremental:
+            lang_state = state.setdefault(dst_lang, dict())
+            data, plans = read_changed_paragraphs(meta_path, fields, src_langs, dst_lang, lang_state)
+            with PROFILER.stage("translate"):
+                result_dict = gpt.process_json(prompt, data) or dict()
+            result_dict, changed_fields = merge_paragraphs(plans, result_dict, dst_lang, lang_state)
+        else:
+            data = read_metadata(meta_path, fields, src_langs, dst_lang)
+            with PROFILER.stage("translate"):
+                result_dict = gpt.process_json(prompt, data)
+            changed_fields = fields
         
-        update_metadata(meta_path, fields, dst_lang, result_dict)
-        exceed_fields += get_exceed_fields(fields, dst_lang, result_dict)
+        update_metadata(meta_path, changed_fields, dst_lang, result_dict)
+        if args.incremental:
+            save_state(state_path, state)
+        exceed_fields += get_exceed_fields(changed_fields, dst_lang, result_dict)
         for field in copy_fields:
             copy_field_from_source(field, meta_path, dst_lang, src_langs[0])
     
-    print(f"Tokens spended in {gpt.total_in_tokens} / out {gpt.total_out_tokens}")
+    print(f"Tokens spended in {gpt.total_in_tokens} (cached {gpt.total_cached_tokens}) / out {gpt.total_out_tokens}")
     print_exceed_fields(exceed_fields)
+    if gpt.cassette:
+        print(f"Cassette: {gpt.cassette.description()}")
+    if gpt.transport:
+        print(f"Connections: {gpt.transport.description()}")
+    PROFILER.finish()
     print("Done")
 
 def copy_field_from_source(field, meta_path, dst_lang, src_lang):
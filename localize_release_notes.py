@@ -1,10 +1,10 @@
-import subprocess, json, tiktoken, argparse, os, tempfile
+import subprocess, json, argparse, os, tempfile
 import concurrent.futures
 from os.path import join
-from openai import OpenAI
-from utils.languages import LANGUAGES_LIST
 from utils.gpt_utils import gpt_models, GPTWrapper
-from tqdm import tqdm
+from utils.profiling import PROFILER, profiled, add_profile_arguments, start_profiling
+from utils.cassette import add_cassette_arguments, create_cassette
+from utils.transport import add_transport_arguments, create_transport
 
 
 def get_prompt():
@@ -29,7 +29,7 @@ def parse_input() -> str:
 
     return "\n".join(release_notes)
 
-def parse_arguments():
+def parse_arguments(argv=None):
     parser = argparse.ArgumentParser(description='Python script localize your application powered with GPT.')
     
     parser.add_argument('--gpt_api_key',
@@ -53,19 +53,99 @@ def parse_arguments():
                         required=True,
                         help='Bundle App ID')
     
-    parser.add_argument('--separate_translation',
+    mode_group = parser.add_mutually_exclusive_group()
+    mode_group.add_argument('--separate_translation',
                         action='store_true',                        
                         default=False,
                         help='If the release notes have a lot of text, it’s better to translate each language separately')
     
+    mode_group.add_argument('--adaptive_translation',
+                        action='store_true',
+                        default=False,
+                        help='Group languages into requests by estimated output tokens and run them concurrently')
+    
+    parser.add_argument('--max_output_tokens',
+                        type=int,
+                        default=2000,
+                        help='Estimated output tokens limit for one request in adaptive mode')
+    
+    parser.add_argument('--max_workers',
+                        type=int,
+                        default=8,
+                        help='Number of concurrent requests in adaptive mode')
+    
+    parser.add_argument('--notes',
+                        type=str,
+                        default=None,
+                        help='Release notes text. If not provided, will ask to write them interactively')
+    
     parser.add_argument('--temperature',                    
                         default=0.6,
                         help='Temperature for GPT call')
     
-    return parser.parse_args()
+    add_profile_arguments(parser)
+    add_cassette_arguments(parser)
+    add_transport_arguments(parser)
+
+    return parser.parse_args(argv)
+
+
+# scripts where text usually takes noticeably more tokens than in english
+WIDE_SCRIPT_LANGUAGES = {"ar", "bg", "el", "he", "hi", "ja", "ko", "ru", "th", "uk", "zh"}
+
+def estimate_output_tokens(notes_tokens: int, lang: str) -> int:
+    base_lang = lang.split("-")[0]
+    factor = 2.0 if base_lang in WIDE_SCRIPT_LANGUAGES else 1.3
+    return int(notes_tokens * factor) + 10 # json key and quotes overhead
+
+def plan_language_sets(notes_tokens: int, languages: list, max_output_tokens: int) -> list:
+    """Group languages so each request stays under `max_output_tokens` estimated output tokens"""
+    lang_sets = []
+    current_set = []
+    current_tokens = 0
+    for lang in languages:
+        lang_tokens = estimate_output_tokens(notes_tokens, lang)
+        if current_set and current_tokens + lang_tokens > max_output_tokens:
+            lang_sets.append(current_set)
+            current_set = []
+            current_tokens = 0
+        current_set.append(lang)
+        current_tokens += lang_tokens
+    if current_set:
+        lang_sets.append(current_set)
+    return lang_sets
+
+def find_missing_languages(release_notes: dict, languages: list) -> list:
+    return [lang for lang in languages if not isinstance(release_notes.get(lang), str) or not release_notes[lang].strip()]
+
+@profiled("translate")
+def translate_adaptive(gpt: GPTWrapper, notes: str, languages: list, max_output_tokens: int, max_workers: int) -> dict:
+    lang_sets = plan_language_sets(gpt.count_tokens(notes), languages, max_output_tokens)
+    print(f"Translating {len(languages)} languages in {len(lang_sets)} requests")
+    prompt = get_prompt()
+
+    def translate_set(lang_set):
+        to_translate = {'notes': notes, 'localize_to': lang_set}
+        result = gpt.process_json(prompt, to_translate) or dict()
+        return {lang: result[lang] for lang in lang_set if lang in result}
+
+    release_notes_localized = dict()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for result in executor.map(translate_set, lang_sets):
+            release_notes_localized.update(result)
+
+        # model sometimes skip languages in a big request, retry them one by one
+        missing = find_missing_languages(release_notes_localized, languages)
+        if missing:
+            print(f"Retrying missing languages: {', '.join(missing)}")
+            for result in executor.map(translate_set, [[lang] for lang in missing]):
+                release_notes_localized.update(result)
+    return release_notes_localized
 
 
+@profiled("load_languages")
 def load_languages(api_key_path, app_identifier):
+    from utils.languages import LANGUAGES_LIST
     temp_dir = tempfile.TemporaryDirectory()
     temp_path = temp_dir.name
     command = f'fastlane deliver download_metadata -m "{temp_path}" --api_key_path "{api_key_path}" -a "{app_identifier}" -f'
@@ -83,6 +163,7 @@ def load_languages(api_key_path, app_identifier):
     return exiting_languages
 
 
+@profiled("upload")
 def upload(release_notes, api_key_path, app_id):
     temp_dir = tempfile.TemporaryDirectory()
     temp_meta = temp_dir.name
@@ -114,38 +195,54 @@ def upload(release_notes, api_key_path, app_id):
         temp_dir.cleanup()
         raise Exception(f"Failed to upload metadata with fastlane: {result.stderr}")
 
-def main():
-    args = parse_arguments()
+def main(argv=None, gpt_factory=GPTWrapper):
+    args = parse_arguments(argv)
+    start_profiling(args)
     executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
     future = executor.submit(load_languages, args.fastlane_api_key_path, args.app_id)
-    gpt = GPTWrapper(api_key=args.gpt_api_key, 
+    gpt = gpt_factory(api_key=args.gpt_api_key, 
                      model=args.gpt_model,
                      temperature=args.temperature)
     if not gpt: exit
+    gpt.cassette = create_cassette(args)
+    gpt.transport = create_transport(args, args.max_workers)
 
-    notes = parse_input()
+    notes = args.notes if args.notes else parse_input()
     languages = future.result()
 
     release_notes_localized = dict()
-    if args.separate_translation:
+    if args.adaptive_translation:
+        release_notes_localized = translate_adaptive(gpt, notes, languages, args.max_output_tokens, args.max_workers)
+    elif args.separate_translation:
+        from tqdm import tqdm
         pbar = tqdm(languages)
         for lang in pbar:
             pbar.set_description(f"Processing language {lang}")
             to_translate = {'notes': notes, 'localize_to': lang}
             prompt = get_prompt()
-            release_notes_lang = gpt.process_json(prompt, to_translate)
+            with PROFILER.stage("translate"):
+                release_notes_lang = gpt.process_json(prompt, to_translate)
             release_notes_localized[lang] = release_notes_lang[lang]
     else:
         to_translate = {'notes': notes, 'localize_to': languages}
         prompt = get_prompt()
-        release_notes_localized = gpt.process_json(prompt, to_translate)
+        with PROFILER.stage("translate"):
+            release_notes_localized = gpt.process_json(prompt, to_translate)
 
     release_notes_preview = json.dumps(release_notes_localized, indent=2, ensure_ascii=False)
     print(f"Release notes:\n{release_notes_preview}\n")
 
-    print(f"Tokens spended in {gpt.total_in_tokens} / out {gpt.total_out_tokens}")
+    print(f"Tokens spended in {gpt.total_in_tokens} (cached {gpt.total_cached_tokens}) / out {gpt.total_out_tokens}")
+    if gpt.cassette:
+        print(f"Cassette: {gpt.cassette.description()}")
+    if gpt.transport:
+        print(f"Connections: {gpt.transport.description()}")
+    missing = find_missing_languages(release_notes_localized, languages)
+    if missing:
+        raise Exception(f"Release notes are missing for languages: {', '.join(missing)}")
     print("Uploading release notes")
     upload(release_notes_localized, args.fastlane_api_key_path, args.app_id)
+    PROFILER.finish()
     print("Done!")
 
 
@@ -1,7 +1,22 @@
-import json, argparse, os, glob
-from utils.gpt_utils import gpt_models, GPTWrapper
-from tqdm.auto import tqdm
-from utils.languages import LANGUAGES
+import json, argparse, os, glob, copy, time
+from utils.gpt_utils import gpt_models, structured_output_models, GPTWrapper, RateLimiter
+from utils.watch import FileWatcher, file_state
+from utils.glossary import Glossary
+from utils.chunking import AdaptiveChunker
+from utils.routing import ModelRouter
+from utils.hedging import Hedger
+from utils import json_io
+from utils.profiling import PROFILER, profiled, add_profile_arguments, start_profiling
+from utils.cassette import add_cassette_arguments, create_cassette
+from utils.budget import Budget, gpt_prices
+from utils.structured import translation_schema
+from utils.source_context import SourceContext, SOURCE_CONTEXT_POLICIES, parse_related_languages
+from utils.comments import COMMENT_ID_KEY, group_by_comment
+from utils.variants import adapt_prompt, request_adaptation, merge_adapted, add_variant_arguments, create_variants
+from utils.transport import add_transport_arguments, create_transport
+
+# streamed entries are written at most this often while a language is translated
+STREAM_COMMIT_SECONDS = 2.0
 
 # for easy access to nested elements
 class Hasher(dict):
@@ -22,11 +37,7 @@ Output:
     else:
         prompt = prompt.replace("{app_description}", "")
     if lang_code:
-        if lang_code in LANGUAGES:
-            lang = LANGUAGES[lang_code]
-            prompt = prompt.replace("{to_lang_prompt}", f"to {lang} (lang code '{lang_code}')")
-        else:
-            prompt = prompt.replace("{to_lang_prompt}", f"to lang code \"{lang_code}\"")
+        prompt = prompt.replace("{to_lang_prompt}", f"to {language_description(lang_code)}")
     else:
         prompt = prompt.replace("{to_lang_prompt}", "")
     
@@ -39,7 +50,57 @@ Output:
 
     return prompt
 
-def prepare_translate_dict(original, src_langs, dst_langs):
+def language_description(lang_code: str) -> str:
+    from utils.languages import LANGUAGES
+    if lang_code in LANGUAGES:
+        return f"{LANGUAGES[lang_code]} (lang code '{lang_code}')"
+    return f"lang code \"{lang_code}\""
+
+def generate_cached_prompt(app_description = None, plural = False):
+    """Language independent prompt of `--cache_layout`, the target language is in `generate_instruction`"""
+    prompt = """Assist with localizing the iOS application. Input JSON has source texts and optional 'comment' with context of every key. Translate every key to the language from the last message. Maintain the text length, spacing, indentation, and placeholders such as '%@' and '%d'.{plural_prompt} Example JSON input: 
+{"support":{"en":"Support"}}
+Language: ru
+Output:
+{"support":{"ru":"Поддержка"}}
+"""
+    if plural:
+        prompt = prompt.replace("{plural_prompt}", ' Ensure correct pluralization for all required keys: "zero", "one", "few", "many", "other".')
+    else:
+        prompt = prompt.replace("{plural_prompt}", "")
+    if app_description:
+        prompt += f"Application is about of: {app_description}.\n"
+    return prompt
+
+def generate_instruction(lang_code: str) -> str:
+    return f"Language: {lang_code}. Translate to {language_description(lang_code)}, output only '{lang_code}' value of every key."
+
+def request_prompts(app_description, lang_code: str, plural: bool, cache_layout: bool):
+    """Returns (prompt, instruction), instruction is None for default layout"""
+    if cache_layout:
+        return generate_cached_prompt(app_description, plural), generate_instruction(lang_code)
+    return generate_prompt(app_description=app_description, lang_code=lang_code, plural=plural), None
+
+def send_chunk(route_gpt: GPTWrapper, prompt: str, instruction, chunk: dict, extra_prompt: str = ""):
+    """Chunk specific text goes to the instruction, if there is one"""
+    if instruction is None:
+        return route_gpt.process_chunk(prompt + extra_prompt, chunk)
+    return route_gpt.process_chunk(prompt, chunk, instruction=instruction + extra_prompt)
+
+def extract_value(localization: dict):
+    """Returns text of the localization, or dict `rule: text` for plural"""
+    if "stringUnit" in localization:
+        return localization["stringUnit"]["value"]
+    elif "variations" in localization:
+        plural_dict = localization["variations"].get("plural")
+        if plural_dict:
+            return { rule : val["stringUnit"]["value"] for rule, val in plural_dict.items() }
+    return None
+
+def prepare_translate_dict(original, src_langs, dst_langs, context_langs = None):
+    """Entries with missing `dst_langs`. Only `context_langs` of source languages are included if set,
+    or the first available source language if an entry has none of them
+    """
     result = dict()
     for key in original["strings"]:
         orig_dict = Hasher(original["strings"][key])
@@ -49,21 +110,17 @@ def prepare_translate_dict(original, src_langs, dst_langs):
         if "comment" in orig_dict:
             simple_dict["comment"] = orig_dict["comment"]
 
-        has_original_text = False
+        source_values = dict()
         for lang in src_langs:
             if lang not in orig_dict["localizations"]: continue
-            val = orig_dict["localizations"][lang]
-            if "stringUnit" in val: 
-                simple_dict[lang] = val["stringUnit"]["value"]
-                has_original_text = True
-            elif "variations" in val: 
-                plural_dict = val["variations"]["plural"]
-                if plural_dict:
-                    dict_val = { rule : val["stringUnit"]["value"] for rule, val in plural_dict.items() }
-                    simple_dict[lang] = dict_val
-                    has_original_text = True
-                
-
+            val = extract_value(orig_dict["localizations"][lang])
+            if val is not None:
+                source_values[lang] = val
+        has_original_text = len(source_values) > 0
+        if context_langs is not None:
+            selected = {lang: val for (lang, val) in source_values.items() if lang in context_langs}
+            source_values = selected or dict(list(source_values.items())[:1])
+        simple_dict.update(source_values)
 
         if not has_original_text:
             print(f"Key {key} don't have any translation in {src_langs}")
@@ -80,12 +137,13 @@ def prepare_translate_dict(original, src_langs, dst_langs):
     
     return result
 
+@profiled("merge")
 def update_with_translations(original, gpt_result, force_update = False, needs_review = False):
     for key in gpt_result:
         original_dict = original["strings"][key]
         for lang in gpt_result[key]:
             if lang in original_dict["localizations"] and not force_update: continue
-            if lang == "comment": continue # gpt somtimes translate comment to
+            if lang in ("comment", COMMENT_ID_KEY): continue # gpt somtimes translate comment to
 
             state = "needs_review" if needs_review else "translated"
             val = gpt_result[key][lang]
@@ -103,6 +161,56 @@ def update_with_translations(original, gpt_result, force_update = False, needs_r
                 }
                 original_dict["localizations"][lang] = {"variations": {"plural": val_dict}}
             
+def is_translated(localization: dict) -> bool:
+    if "stringUnit" in localization:
+        return localization["stringUnit"].get("state") == "translated"
+    plural_dict = localization.get("variations", {}).get("plural")
+    if plural_dict:
+        return all(val.get("stringUnit", {}).get("state") == "translated" for val in plural_dict.values())
+    return False
+
+def source_signature(value: dict, src_langs: list):
+    """Source texts and comment of the entry, or None if there is no source text"""
+    localizations = value.get("localizations", {})
+    source = {lang: extract_value(localizations[lang]) for lang in src_langs if lang in localizations}
+    source = {lang: text for (lang, text) in source.items() if text is not None}
+    if not source: return None
+    return json_io.dumps_compact([value.get("comment"), sorted(source.items())])
+
+def build_translation_index(original_list: list, src_langs: list) -> dict:
+    """Source signature -> {lang: localization} for all `translated` localizations of all catalogs"""
+    index = dict()
+    for original in original_list:
+        for value in original.get("strings", {}).values():
+            signature = source_signature(value, src_langs)
+            if signature is None: continue
+            for (lang, localization) in value.get("localizations", {}).items():
+                if lang not in src_langs and is_translated(localization):
+                    index.setdefault(signature, dict()).setdefault(lang, localization)
+    return index
+
+def with_state(localization: dict, state: str) -> dict:
+    localization = copy.deepcopy(localization)
+    units = [localization.get("stringUnit")] + \
+            [val.get("stringUnit") for val in localization.get("variations", {}).get("plural", {}).values()]
+    for unit in units:
+        if unit: unit["state"] = state
+    return localization
+
+def fill_from_index(original: dict, index: dict, src_langs: list, dst_langs: list, state: str) -> int:
+    """Fills missing localizations with existing translations of the same source text and comment"""
+    filled_count = 0
+    for value in original.get("strings", {}).values():
+        if value.get("shouldTranslate") == False: continue
+        signature = source_signature(value, src_langs)
+        if signature not in index: continue
+        localizations = value.setdefault("localizations", dict())
+        for lang in dst_langs:
+            if lang not in localizations and lang in index[signature]:
+                localizations[lang] = with_state(index[signature][lang], state)
+                filled_count += 1
+    return filled_count
+
 def find_unique_key(base_key, used_keys):
     if base_key not in used_keys:
         return base_key
@@ -113,38 +221,99 @@ def find_unique_key(base_key, used_keys):
     
     return f"{base_key}_{counter}"
 
-def extract_languages_from_files(file_paths: list):
-    """Extract all available languages from xcstrings files"""
+def scan_catalog(data: dict) -> dict:
+    """Source language, all languages and languages of every translatable key of loaded file"""
+    languages = set()
+    key_languages = dict()
+    for (key, value) in data.get("strings", {}).items():
+        localizations = value.get("localizations", {})
+        languages.update(localizations)
+        if value.get("shouldTranslate") != False:
+            key_languages[key] = set(localizations)
+    return {
+        "source_language": data.get("sourceLanguage"),
+        "languages": languages,
+        "key_languages": key_languages,
+    }
+
+def load_and_scan(path: str):
+    data = json_io.load(path)
+    return data, scan_catalog(data)
+
+@profiled("load")
+def load_catalogs(paths: list, max_workers: int = 8):
+    """Parses every file once, in parallel. Returns (catalogs, scans from `scan_catalog`)"""
+    if len(paths) < 2:
+        loaded = [load_and_scan(path) for path in paths]
+    else:
+        import concurrent.futures
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(max_workers, len(paths))) as executor:
+            loaded = list(executor.map(load_and_scan, paths))
+    return [data for (data, _) in loaded], [scan for (_, scan) in loaded]
+
+def extract_languages(scans: list):
+    """All languages and the first source language of scanned files"""
     all_languages = set()
     source_language = None
-    
-    for file_path in file_paths:
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            # Get source language
-            if 'sourceLanguage' in data and source_language is None:
-                source_language = data['sourceLanguage']
-            
-            # Extract languages from all string entries
-            if 'strings' in data:
-                for key, value in data['strings'].items():
-                    if 'localizations' in value:
-                        all_languages.update(value['localizations'].keys())
-        except Exception as e:
-            print(f"Warning: Could not extract languages from {file_path}: {e}")
-    
+    for scan in scans:
+        if source_language is None:
+            source_language = scan["source_language"]
+        all_languages.update(scan["languages"])
     return list(all_languages), source_language
 
-def group_multiple_inputs(inputs: list, src_langs: list, dst_langs: list):
+def missing_slots(scans: list, src_langs: list, dst_langs: list) -> dict:
+    """Number of keys with source text and without translation, by language"""
+    src_langs = set(src_langs)
+    result = {lang: 0 for lang in dst_langs}
+    for scan in scans:
+        for key_langs in scan["key_languages"].values():
+            if not key_langs & src_langs: continue
+            for lang in dst_langs:
+                if lang not in key_langs:
+                    result[lang] += 1
+    return result
+
+def resolve_languages(scans: list, localize_from, localize_to):
+    """Languages from arguments, or auto-detected from scanned files if not provided"""
+    # Auto-detect languages if not provided
+    if localize_from is None or localize_to is None:
+        print("Auto-detecting languages from files...")
+        all_languages, source_language = extract_languages(scans)
+        
+        if localize_from is None:
+            if source_language:
+                src_langs = [source_language]
+                print(f"Using source language: {source_language}")
+            else:
+                print("Warning: Could not detect source language, using 'en' as default")
+                src_langs = ["en"]
+        else:
+            src_langs = localize_from.split(",")
+        
+        if localize_to is None:
+            # Use all languages except source languages
+            dst_langs = [lang for lang in all_languages if lang not in src_langs]
+            if dst_langs:
+                print(f"Auto-detected target languages: {', '.join(sorted(dst_langs))}")
+            else:
+                print("Warning: No target languages found in files")
+        else:
+            dst_langs = localize_to.split(",")
+    else:
+        src_langs = localize_from.split(",")
+        dst_langs = localize_to.split(",")
+
+    return src_langs, dst_langs
+
+@profiled("prepare")
+def group_multiple_inputs(inputs: list, src_langs: list, dst_langs: list, context_langs = None):
     normal_dict = dict()
     plural_dict = dict()
     key_mappings = []
     used_keys = set()
     
     for (file_idx, original) in enumerate(inputs):
-        prepared = prepare_translate_dict(original, src_langs, dst_langs)
+        prepared = prepare_translate_dict(original, src_langs, dst_langs, context_langs)
         file_mapping = {}
         
         for (original_key, item) in prepared.items():
@@ -164,6 +333,36 @@ def group_multiple_inputs(inputs: list, src_langs: list, dst_langs: list):
     
     return [x for x in [(normal_dict, False), (plural_dict, True)] if len(x) > 0], key_mappings
 
+def entry_length(item: dict) -> int:
+    """Length of the longest source text of entry from `prepare_translate_dict`, plurals included"""
+    texts = [val if isinstance(val, str) else json.dumps(val, ensure_ascii=False) 
+             for (key, val) in item.items() if key != "comment" and val is not None]
+    return max((len(text) for text in texts), default=0)
+
+def by_priority(elem: dict) -> dict:
+    """Shortest strings first: they are the most visible UI and the cheapest ones"""
+    return dict(sorted(elem.items(), key=lambda x: entry_length(x[1])))
+
+def order_entries(gpt: GPTWrapper, elem: dict, prioritize = None) -> dict:
+    """Shortest strings first with a budget (or `prioritize`), entries with the same comment together for `hoist_comments`.
+    With both, a group of entries with the same comment takes the place of its shortest entry
+    """
+    if gpt.budget if prioritize is None else prioritize:
+        elem = by_priority(elem)
+    if gpt.hoist_comments:
+        elem = group_by_comment(elem)
+    return elem
+
+def prioritize_languages(dst_langs: list, priority_languages: list) -> list:
+    priority = [lang for lang in priority_languages if lang in dst_langs]
+    return priority + [lang for lang in dst_langs if lang not in priority]
+
+def print_left_untranslated(original_list: list, src_langs: list, dst_langs: list):
+    left = {lang: sum(len(prepare_translate_dict(original, src_langs, [lang])) for original in original_list) for lang in dst_langs}
+    left = {lang: count for (lang, count) in left.items() if count > 0}
+    if left:
+        print(f"Left untranslated {sum(left.values())} strings: " + ", ".join(f"{lang} {count}" for (lang, count) in left.items()))
+
 def ungroup_outputs(data: dict, key_mappings: list):
     groups = []
     for file_mapping in key_mappings:
@@ -174,7 +373,7 @@ def ungroup_outputs(data: dict, key_mappings: list):
         groups.append(file_data)
     return groups
 
-def parse_arguments():
+def parse_arguments(argv=None):
     parser = argparse.ArgumentParser(description='Python script localize your application powered with GPT.')
     
     parser.add_argument('--gpt_api_key', '-k',
@@ -213,6 +412,22 @@ def parse_arguments():
                         default=None,
                         help='Array of language codes like "ru,en,de". If not provided, will use the source language from the files.')
     
+    parser.add_argument('--source_context',
+                        type=str,
+                        choices=SOURCE_CONTEXT_POLICIES,
+                        default='all',
+                        help='Source languages sent for every target with several --localize_from: all, primary (the first one), related (the first one and the closest related)')
+    
+    parser.add_argument('--related_languages',
+                        type=str,
+                        default=None,
+                        help='Related source language for targets, used by `--source_context related` before language families, e.g. "pt-BR:es,uk:ru"')
+    
+    parser.add_argument('--compare_source_context',
+                        action='store_true',
+                        default=False,
+                        help='Don\'t translate, print input tokens of --source_context against sending all source languages')
+    
     parser.add_argument('--app_description', '-desc',
                         type=str,
                         default=None,
@@ -223,11 +438,179 @@ def parse_arguments():
                         default=None,
                         help=f"If 'None', then will use maximum number of tokens for model {gpt_models}")
 
-    args = parser.parse_args()
+    parser.add_argument('--route_simple_model',
+                        type=str,
+                        default=None,
+                        choices=list(gpt_models.keys()),
+                        help=f'Send simple strings (short, no plurals, few placeholders) to this cheaper model. Choose from: {list_models}')
+    
+    parser.add_argument('--route_max_length',
+                        type=int,
+                        default=40,
+                        help='Routing: max length of a simple string')
+    
+    parser.add_argument('--route_max_placeholders',
+                        type=int,
+                        default=1,
+                        help='Routing: max number of placeholders like %%@ in a simple string')
+    
+    parser.add_argument('--route_comments_to_strong',
+                        action='store_true',
+                        default=False,
+                        help='Routing: strings with developer comments always go to the main model')
+    
+    parser.add_argument('--reuse_translations',
+                        action='store_true',
+                        default=False,
+                        help='Before translating, fill missing strings with existing `translated` values of the same source text and comment from any loaded file')
+    
+    parser.add_argument('--reuse_state',
+                        type=str,
+                        default="needs_review",
+                        help='State of strings filled by --reuse_translations (default: needs_review)')
+    
+    parser.add_argument('--glossary_dir',
+                        type=str,
+                        default=None,
+                        help='Directory with `<lang_code>.json` termbase files: {"source term": "translation"}. Only terms found in a request are added to its prompt')
+    
+    parser.add_argument('--max_cost',
+                        type=float,
+                        default=None,
+                        help='Stop sending requests when the run would cost more, USD. Short strings and first target languages go first')
+    
+    parser.add_argument('--max_tokens',
+                        type=int,
+                        default=None,
+                        help='Stop sending requests when the run would use more input and output tokens')
+    
+    parser.add_argument('--priority_languages',
+                        type=str,
+                        default=None,
+                        help='Comma separated languages translated before others, e.g. main markets when budget is limited')
+    
+    parser.add_argument('--manifest',
+                        type=str,
+                        default=None,
+                        help='JSON project manifest with many catalog groups, translated in one run')
+    
+    parser.add_argument('--max_workers',
+                        type=int,
+                        default=8,
+                        help='Number of concurrent requests, chunks of one language are sent in parallel too; 1 sends them one by one')
+    
+    parser.add_argument('--adaptive_chunks',
+                        action='store_true',
+                        default=False,
+                        help='Choose chunk size from measured latency and concurrency, instead of token limit only')
+    
+    parser.add_argument('--max_chunk_seconds',
+                        type=float,
+                        default=60.0,
+                        help='Adaptive chunks: expected duration limit of one request, seconds')
+    
+    parser.add_argument('--chunk_overhead_ratio',
+                        type=float,
+                        default=0.2,
+                        help='Adaptive chunks: max share of request time spent on fixed per-request overhead')
+    
+    parser.add_argument('--requests_per_minute',
+                        type=float,
+                        default=None,
+                        help='Limit requests rate, shared by all concurrent requests')
+    
+    parser.add_argument('--hedge_percentile',
+                        type=float,
+                        default=None,
+                        help='Send a duplicate request if one takes longer than this percentile of latency per output token, e.g. 95. '
+                             'First response wins, a streamed loser is closed, a plain one can\'t be stopped and its output is billed but not counted')
+    
+    parser.add_argument('--hedge_max_ratio',
+                        type=float,
+                        default=0.1,
+                        help='Max number of duplicate requests relative to all requests, limits extra spend')
+    
+    parser.add_argument('--stream',
+                        action='store_true',
+                        default=False,
+                        help='Stream responses: entries are parsed and written while they arrive, and only missing ones are requested again if response is cut off')
+    
+    parser.add_argument('--cache_layout',
+                        action='store_true',
+                        default=False,
+                        help='Put the target language last in requests, so the same chunk in different languages reuses provider prompt cache')
+    
+    parser.add_argument('--hoist_comments',
+                        action='store_true',
+                        default=False,
+                        help='Send comments repeated in a request once, in a table referenced by id, and put keys with the same comment into the same request')
+
+    parser.add_argument('--structured_outputs',
+                        action='store_true',
+                        default=False,
+                        help='Constrain responses with strict JSON schema of expected keys, languages and plural forms (gpt-4o-mini, gpt-4.1 models)')
+    
+    parser.add_argument('--watch',
+                        action='store_true',
+                        default=False,
+                        help='Keep running and translate new or changed keys as soon as files are changed')
+    
+    parser.add_argument('--watch_interval',
+                        type=float,
+                        default=1.0,
+                        help='How often to check files for changes in watch mode, seconds')
+    
+    parser.add_argument('--watch_debounce',
+                        type=float,
+                        default=2.0,
+                        help='Wait until files stay unchanged for this time before translating, seconds')
+    
+    parser.add_argument('--plan_queue',
+                        type=str,
+                        default=None,
+                        help='Don\'t translate, save all requests to this SQLite file on shared storage for --queue_worker processes')
+    
+    parser.add_argument('--queue_worker',
+                        type=str,
+                        default=None,
+                        help='Run requests from this SQLite file made by --plan_queue, several workers can share it')
+    
+    parser.add_argument('--merge_queue',
+                        type=str,
+                        default=None,
+                        help='Apply results from this SQLite file made by --plan_queue to the output files')
+    
+    parser.add_argument('--lease_seconds',
+                        type=float,
+                        default=600,
+                        help='Request claimed by a worker is given to another worker if not finished in this time, seconds')
+
+    add_profile_arguments(parser)
+    add_cassette_arguments(parser)
+    add_variant_arguments(parser)
+    add_transport_arguments(parser)
+
+    args = parser.parse_args(argv)
+
+    if (args.adapt_variants or args.copy_variants) and (args.plan_queue or args.queue_worker or args.merge_queue or args.manifest):
+        parser.error("--adapt_variants and --copy_variants can't be used with --manifest, --plan_queue, --queue_worker or --merge_queue")
     
+    if args.queue_worker or args.merge_queue:
+        if args.files or args.files_pattern or args.manifest:
+            parser.error("Files are taken from the queue, don't use --file/--files, --files_pattern or --manifest with --queue_worker or --merge_queue")
+        return args
+
+    if args.plan_queue and (args.manifest or args.watch):
+        parser.error("--plan_queue can't be used with --manifest or --watch")
+
+    if args.manifest:
+        if args.files or args.files_pattern:
+            parser.error("Cannot use --manifest together with --file/--files or --files_pattern")
+        return args
+
     # Validate that either --files or --files_pattern is provided
     if not args.files and not args.files_pattern:
-        parser.error("Either --file/--files or --files_pattern must be provided")
+        parser.error("Either --file/--files, --files_pattern or --manifest must be provided")
     
     if args.files and args.files_pattern:
         parser.error("Cannot use both --file/--files and --files_pattern at the same time")
@@ -244,57 +627,635 @@ def parse_arguments():
 
     return args
 
+@profiled("save")
 def save(file: str, data: dict):
-    json.dump(data, 
-              open(file, "w"), 
-              indent=2, 
-              ensure_ascii=False,
-              separators=(',', ' : '),
-              sort_keys=True) # override separators to make identical
-
-def main():
-    args = parse_arguments()
-    gpt = GPTWrapper(api_key=args.gpt_api_key, 
-                     model=args.gpt_model, 
-                     max_input_token_count=args.max_input_token_count)
+    with open(file, "w") as f:
+        f.write(json_io.dumps_xcode(data)) # same formatting as Xcode
+
+@profiled("reuse")
+def reuse_translations(original_list: list, out_file_path: list, src_langs: list, dst_langs: list, state: str, index = None):
+    if index is None:
+        index = build_translation_index(original_list, src_langs)
+    total_count = 0
+    for (idx, original) in enumerate(original_list):
+        filled_count = fill_from_index(original, index, src_langs, dst_langs, state)
+        if filled_count > 0:
+            save(out_file_path[idx], original)
+        total_count += filled_count
+    print(f"Reused {total_count} existing translations")
+
+def put_until_stopped(target_queue, item, stop) -> bool:
+    """Puts to bounded queue, gives up if consumer is stopped"""
+    import queue
+    while not stop.is_set():
+        try:
+            target_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+def translate_catalogs(gpt: GPTWrapper, original_list: list, src_langs: list, dst_langs: list, app_description, on_translated, glossary = None, router = None, 
+                       cache_layout = False, source_context = None):
+    """Translates missing strings language by language, calls `on_translated(file_idx, data)` with results.
+    Stages run in parallel: planning of the next language, requests of the current one, and `on_translated` of the previous one.
+    """
+    import queue, threading
+    from tqdm.auto import tqdm
+    planned = queue.Queue(maxsize=2)
+    finished = queue.Queue(maxsize=2)
+    stop = threading.Event()
+    writer_errors = []
+
+    def plan():
+        try:
+            for dst_lang in dst_langs:
+                with PROFILER.stage("plan"):
+                    context_langs = source_context.languages(src_langs, dst_lang) if source_context else None
+                    elems, key_mappings = group_multiple_inputs(original_list, src_langs, [dst_lang], context_langs)
+                    requests = []
+                    for (elem, plural) in elems:
+                        elem = order_entries(gpt, elem)
+                        prompt, instruction = request_prompts(app_description, dst_lang, plural, cache_layout)
+                        count_prompt = prompt if instruction is None else f"{prompt}\n{instruction}"
+                        chunk_prompt = glossary.chunk_prompt(dst_lang) if glossary else None
+                        routes = [(gpt, elem)]
+                        if router:
+                            simple, strong = router.split(elem)
+                            routes = [(router.simple_gpt, simple), (gpt, strong)]
+                        for (route_gpt, route_elem) in routes:
+                            if not route_elem: continue
+                            chunks = None # adaptive chunks are planned during requests, from measured latency
+                            if not route_gpt.chunker:
+                                chunks = route_gpt.split_json(count_prompt, route_elem, chunk_prompt)
+                                if chunks is None: continue
+                            requests.append((route_gpt, prompt, route_elem, chunk_prompt, instruction, chunks))
+                if not put_until_stopped(planned, (dst_lang, key_mappings, requests), stop): return
+            put_until_stopped(planned, None, stop)
+        except Exception as e:
+            put_until_stopped(planned, e, stop)
+
+    def write():
+        while True:
+            item = finished.get()
+            if item is None: return
+            if writer_errors: continue # keep draining, so requests stage isn't blocked
+            key_mappings, merged_out = item
+            try:
+                with PROFILER.stage("write_back"):
+                    ungrouped_data = ungroup_outputs(merged_out, key_mappings)
+                    for (idx, data) in enumerate(ungrouped_data):
+                        if idx >= len(original_list) or len(data) == 0:
+                            continue
+                        on_translated(idx, data)
+            except Exception as e:
+                writer_errors.append(e)
+
+    def entry_committer(key_mappings, committed: dict):
+        """`on_entry` of streamed responses, sends received entries to the writer before the language is finished"""
+        lock = threading.Lock()
+        pending = dict()
+        last_commit = [time.monotonic()]
+        def on_entry(key, value):
+            with lock:
+                pending[key] = value
+                if time.monotonic() - last_commit[0] < STREAM_COMMIT_SECONDS: return
+                batch = dict(pending)
+                pending.clear()
+                committed.update(batch)
+                last_commit[0] = time.monotonic()
+            finished.put((key_mappings, batch))
+        return on_entry
+
+    planner = threading.Thread(target=plan, daemon=True)
+    writer = threading.Thread(target=write, daemon=True)
+    planner.start()
+    writer.start()
+    pbar = tqdm(total=len(dst_langs))
+    try:
+        while not writer_errors:
+            item = planned.get()
+            if item is None: break
+            if isinstance(item, Exception): raise item
+            dst_lang, key_mappings, requests = item
+            pbar.set_description_str(f"Translating to {dst_lang}")
+            merged_out = {}
+            committed = dict() # entries already written while streaming
+            for (route_gpt, prompt, route_elem, chunk_prompt, instruction, chunks) in requests:
+                on_entry = entry_committer(key_mappings, committed) if route_gpt.stream else None
+                with PROFILER.stage("translate"):
+                    out = route_gpt.process_json(prompt, route_elem, chunk_prompt, on_entry, instruction, chunks)
+                merged_out.update(out or dict())
+            finished.put((key_mappings, {key: val for (key, val) in merged_out.items() if committed.get(key) != val}))
+            pbar.update(1)
+    finally:
+        stop.set()
+        finished.put(None)
+        writer.join()
+        pbar.close()
+    if writer_errors:
+        raise writer_errors[0]
+
+def derive_variants(gpt: GPTWrapper, original_list: list, variant_langs: list, variants, on_translated):
+    """Fills regional variants from localizations of their base language, calls `on_translated(file_idx, data)` with results.
+    Adapted entries come from the model, entries it skips are the same as the base.
+    """
+    for variant in variant_langs:
+        base = variants.base(variant)
+        entries = dict()
+        key_mappings = []
+        used_keys = set()
+        for original in original_list:
+            file_mapping = dict()
+            for (key, value) in original.get("strings", {}).items():
+                if value.get("shouldTranslate") == False: continue
+                localizations = value.get("localizations", {})
+                if variant in localizations or base not in localizations: continue
+                base_value = extract_value(localizations[base])
+                if base_value is None: continue
+                unique_key = find_unique_key(key, used_keys)
+                used_keys.add(unique_key)
+                file_mapping[key] = unique_key
+                entries[unique_key] = base_value
+            key_mappings.append(file_mapping)
+        if not entries: continue
+
+        adapted = dict()
+        if not variants.is_copy(variant):
+            prompt = adapt_prompt(language_description(base), language_description(variant))
+            with PROFILER.stage("translate"):
+                adapted = request_adaptation(gpt, prompt, entries)
+        derived = {key: {variant: merge_adapted(base_value, adapted.get(key))} for (key, base_value) in entries.items()}
+        adapted_count = sum(1 for (key, base_value) in entries.items() if derived[key][variant] != base_value)
+        print(f"Derived {variant} from {base}: {len(entries)} strings, {adapted_count} adapted")
+        with PROFILER.stage("write_back"):
+            for (idx, data) in enumerate(ungroup_outputs(derived, key_mappings)):
+                if data:
+                    on_translated(idx, data)
+
+def source_fingerprints(original: dict, src_langs: list) -> dict:
+    """Source texts and comment of every key, to find new or changed entries"""
+    result = dict()
+    for key, value in original.get("strings", {}).items():
+        localizations = value.get("localizations", {})
+        source = {lang: extract_value(localizations[lang]) for lang in src_langs if lang in localizations}
+        result[key] = json.dumps([value.get("comment"), value.get("shouldTranslate"), source], 
+                                 ensure_ascii=False, sort_keys=True)
+    return result
+
+@profiled("load")
+def load(file: str) -> dict:
+    return json_io.load(file)
+
+def write_back(out_path: str, src_path: str, translations: dict, stale_keys: set, fingerprints: dict, src_langs: list, watcher) -> int:
+    """Merge translations into the current file content, without overwriting changes made while we were translating.
+    Returns number of written keys
+    """
+    while True:
+        state = file_state(out_path)
+        if state is None:
+            # output file of --out_files doesn't exist yet, it starts as a copy of the source
+            source = load(src_path)
+            current = copy.deepcopy(source)
+        else:
+            current = load(out_path)
+            source = current if os.path.abspath(src_path) == os.path.abspath(out_path) else load(src_path)
+        source_fps = source_fingerprints(source, src_langs)
+        # skip keys which source changed again, they will be handled on the next iteration
+        actual = {key: val for key, val in translations.items() 
+                  if key in source_fps and source_fps.get(key) == fingerprints.get(key)}
+        strings = current.setdefault("strings", dict())
+        # with --out_files, new keys and changed source texts are taken from the source file
+        for key in (actual if source is not current else []):
+            source_entry = copy.deepcopy(source["strings"][key])
+            if key not in strings:
+                strings[key] = source_entry
+                continue
+            for field in ("comment", "shouldTranslate"):
+                if field in source_entry: strings[key][field] = source_entry[field]
+                else: strings[key].pop(field, None)
+            localizations = strings[key].setdefault("localizations", dict())
+            localizations.update({lang: val for (lang, val) in source_entry.get("localizations", {}).items() if lang in src_langs})
+        written = {key for (key, val) in actual.items() 
+                   if key in stale_keys or any(lang not in strings[key].get("localizations", {}) for lang in val if lang != "comment")}
+        update_with_translations(current, {k: v for k, v in actual.items() if k in stale_keys}, force_update=True)
+        update_with_translations(current, {k: v for k, v in actual.items() if k not in stale_keys})
+        if file_state(out_path) != state:
+            continue # file changed while merging, start again
+        save(out_path, current)
+        watcher.mark_seen(out_path)
+        return len(written)
+
+def watch_catalogs(gpt: GPTWrapper, src_paths: list, out_file_path: list, src_langs: list, dst_langs: list, args, glossary = None, router = None, source_context = None,
+                   variants = None):
+    translate_langs, variant_langs = dst_langs, []
+    if variants:
+        translate_langs, variant_langs = variants.split(dst_langs, variants.base_languages(src_langs, dst_langs))
+    known_fingerprints = [source_fingerprints(load(path), src_langs) for path in src_paths]
+    watcher = FileWatcher(src_paths, interval=args.watch_interval, debounce=args.watch_debounce)
+    print(f"Watching {len(src_paths)} files for changes, press Ctrl+C to stop")
+    try:
+        while True:
+            changed_paths = set(watcher.wait_for_changes())
+            work_list = []
+            for (idx, path) in enumerate(src_paths):
+                if os.path.abspath(path) not in changed_paths:
+                    continue
+                watcher.mark_seen(path)
+                current = load(path)
+                fingerprints = source_fingerprints(current, src_langs)
+                changed_keys = {key for key, fp in fingerprints.items() if known_fingerprints[idx].get(key) != fp}
+                stale_keys = {key for key in changed_keys if key in known_fingerprints[idx]}
+                known_fingerprints[idx] = fingerprints
+                if not changed_keys:
+                    continue
+                # only new or changed entries, changed ones need to be translated again
+                work = {"sourceLanguage": current.get("sourceLanguage"), "strings": dict()}
+                for key in changed_keys:
+                    entry = copy.deepcopy(current["strings"][key])
+                    if key in stale_keys:
+                        localizations = entry.get("localizations", {})
+                        entry["localizations"] = {lang: val for lang, val in localizations.items() if lang not in dst_langs}
+                    work["strings"][key] = entry
+                work_list.append((idx, work, stale_keys, fingerprints))
+            
+            if not work_list:
+                continue
+            print(f"Translating changes in {len(work_list)} files")
+            translations = [dict() for _ in work_list]
+            def on_translated(work_idx, data):
+                for key, val in data.items():
+                    translations[work_idx].setdefault(key, dict()).update(val)
+            works = [work for (_, work, _, _) in work_list]
+            translate_catalogs(gpt, works, src_langs, translate_langs, args.app_description, on_translated, glossary, router, 
+                               args.cache_layout, source_context)
+            if variant_langs:
+                # variants are derived from the fresh translations of their base
+                for (work, work_translations) in zip(works, translations):
+                    update_with_translations(work, work_translations, force_update=True)
+                derive_variants(gpt, works, variant_langs, variants, on_translated)
+            
+            for (work_idx, (idx, _, stale_keys, fingerprints)) in enumerate(work_list):
+                if translations[work_idx]:
+                    written_count = write_back(out_file_path[idx], src_paths[idx], translations[work_idx], stale_keys, fingerprints, src_langs, watcher)
+                    print(f"Updated {written_count} keys in {out_file_path[idx]}")
+    except KeyboardInterrupt:
+        watcher.stop()
+
+def load_manifest(manifest_path: str) -> list:
+    """Catalog groups from manifest like:
+    {"app_description": "...", "groups": [{"files_pattern": "App/**/*.xcstrings", "app_description": "...", "localize_from": "en", "localize_to": "de,fr"}, ...]}
+    Paths are relative to the manifest file, group values override top level ones.
+    """
+    manifest = load(manifest_path)
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    groups = []
+    for (idx, group) in enumerate(manifest["groups"]):
+        group = {**{k: v for k, v in manifest.items() if k != "groups"}, **group}
+        if "files_pattern" in group:
+            paths = sorted(glob.glob(os.path.join(base_dir, group["files_pattern"]), recursive=True))
+        else:
+            paths = [os.path.join(base_dir, f) for f in group.get("files", [])]
+        if not paths:
+            print(f"Warning: No files found for group {group.get('name', idx)}")
+            continue
+        catalogs, scans = load_catalogs(paths)
+        src_langs, dst_langs = resolve_languages(scans, group.get("localize_from"), group.get("localize_to"))
+        groups.append({
+            "name": group.get("name", str(idx)),
+            "paths": paths,
+            "catalogs": catalogs,
+            "app_description": group.get("app_description"),
+            "src_langs": src_langs,
+            "dst_langs": dst_langs,
+        })
+    return groups
+
+def localize_manifest(gpt: GPTWrapper, manifest_path: str, max_workers: int, glossary = None, router = None, reuse_state = None, priority_languages = None, 
+                      cache_layout = False, source_context = None):
+    """Translates all groups with one global queue of requests.
+    Entries from different groups with identical prompts are packed in the same requests.
+    """
+    import concurrent.futures
+    from tqdm.auto import tqdm
+    groups = load_manifest(manifest_path)
+    if reuse_state:
+        # index is built across catalogs of all groups
+        all_catalogs = [catalog for group in groups for catalog in group["catalogs"]]
+        for group in groups:
+            index = build_translation_index(all_catalogs, group["src_langs"])
+            reuse_translations(group["catalogs"], group["paths"], group["src_langs"], group["dst_langs"], reuse_state, index)
+
+    # (prompt, instruction) -> packed entries from all groups; pack key -> (group idx, lang, grouped key)
+    packs = dict()
+    pack_langs = dict()
+    pack_routes = dict()
+    key_mappings = dict()
+    for (group_idx, group) in enumerate(groups):
+        print(f"Group {group['name']}: {len(group['paths'])} files, {', '.join(group['src_langs'])} -> {', '.join(group['dst_langs'])}")
+        for dst_lang in prioritize_languages(group["dst_langs"], priority_languages or []):
+            context_langs = source_context.languages(group["src_langs"], dst_lang) if source_context else None
+            elems, key_mappings[(group_idx, dst_lang)] = group_multiple_inputs(group["catalogs"], group["src_langs"], [dst_lang], context_langs)
+            for (elem, plural) in elems:
+                prompt = request_prompts(group["app_description"], dst_lang, plural, cache_layout)
+                pack = packs.setdefault(prompt, dict())
+                pack_langs[prompt] = dst_lang
+                routes = pack_routes.setdefault(prompt, dict())
+                for (key, item) in elem.items():
+                    pack_key = find_unique_key(key, pack)
+                    pack[pack_key] = item
+                    routes[pack_key] = (group_idx, dst_lang, key)
+
+    tasks = []
+    for (prompt, pack) in packs.items():
+        chunk_prompt = glossary.chunk_prompt(pack_langs[prompt]) if glossary else None
+        pack = order_entries(gpt, pack)
+        routes = [(gpt, pack)]
+        if router:
+            simple, strong = router.split(pack)
+            routes = [(router.simple_gpt, simple), (gpt, strong)]
+        for (route_gpt, route_pack) in routes:
+            if not route_pack: continue
+            chunks = route_gpt.split_json("\n".join(text for text in prompt if text is not None), route_pack, chunk_prompt)
+            if chunks is None: continue
+            tasks += [(route_gpt, prompt, chunk, chunk_prompt(chunk) if chunk_prompt else "") for chunk in chunks]
+    if gpt.budget:
+        # with limited budget the most valuable requests go first: priority languages, then short strings
+        lang_order = prioritize_languages(list(dict.fromkeys(pack_langs.values())), priority_languages or [])
+        tasks.sort(key=lambda task: (lang_order.index(pack_langs[task[1]]), min(entry_length(item) for item in task[2].values())))
+    else:
+        # biggest chunks first, so the longest requests don't finish the run
+        tasks.sort(key=lambda task: len(task[2]), reverse=True)
+    print(f"Sending {len(tasks)} requests for {len(packs)} prompts")
+
+    results = {key: dict() for key in key_mappings}
+    pending = {key: 0 for key in key_mappings}
+    task_targets = []
+    for (_, prompt, chunk, _) in tasks:
+        targets = {pack_routes[prompt][pack_key][:2] for pack_key in chunk}
+        for target in targets:
+            pending[target] += 1
+        task_targets.append(targets)
+
+    def apply(target):
+        group_idx, dst_lang = target
+        group = groups[group_idx]
+        ungrouped_data = ungroup_outputs(results[target], key_mappings[target])
+        for (idx, data) in enumerate(ungrouped_data):
+            if len(data) == 0: continue
+            update_with_translations(group["catalogs"][idx], data, force_update=True)
+            save(group["paths"][idx], group["catalogs"][idx])
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(send_chunk, route_gpt, *prompt, chunk, extra_prompt): task_idx 
+                   for (task_idx, (route_gpt, prompt, chunk, extra_prompt)) in enumerate(tasks)}
+        for future in tqdm(concurrent.futures.as_completed(futures), total=len(futures)):
+            task_idx = futures[future]
+            _, prompt, _, _ = tasks[task_idx]
+            for (pack_key, val) in (future.result() or dict()).items():
+                if pack_key not in pack_routes[prompt]: continue
+                group_idx, dst_lang, key = pack_routes[prompt][pack_key]
+                results[(group_idx, dst_lang)][key] = val
+            for target in task_targets[task_idx]:
+                pending[target] -= 1
+                if pending[target] == 0:
+                    apply(target)
+
+    if gpt.budget and gpt.budget.exhausted:
+        for group in groups:
+            print(f"Group {group['name']}:")
+            print_left_untranslated(group["catalogs"], group["src_langs"], group["dst_langs"])
+
+def compare_source_context(gpt: GPTWrapper, original_list: list, src_langs: list, dst_langs: list, source_context: SourceContext):
+    """Prints input tokens of entries with selected source languages against all source languages"""
+    total_all, total_selected = 0, 0
+    print(f"{'language':<12}{'sources':<20}{'all, tokens':>14}{'selected, tokens':>18}")
+    for dst_lang in dst_langs:
+        context_langs = source_context.languages(src_langs, dst_lang)
+        tokens_all = sum(gpt.count_tokens(json_io.dumps_compact(elem)) 
+                         for (elem, _) in group_multiple_inputs(original_list, src_langs, [dst_lang])[0])
+        tokens_selected = sum(gpt.count_tokens(json_io.dumps_compact(elem)) 
+                              for (elem, _) in group_multiple_inputs(original_list, src_langs, [dst_lang], context_langs)[0])
+        total_all += tokens_all
+        total_selected += tokens_selected
+        print(f"{dst_lang:<12}{','.join(context_langs or src_langs):<20}{tokens_all:>14}{tokens_selected:>18}")
+    saved = (1 - total_selected / total_all) * 100 if total_all else 0
+    print(f"Total input tokens of entries: {total_all} -> {total_selected} ({saved:.1f}% saved), prompts are not included")
+
+def plan_queue(gpt: GPTWrapper, queue_path: str, original_list: list, src_paths: list, out_file_path: list, src_langs: list, dst_langs: list, 
+               app_description, glossary = None, router = None, reuse_state = None, cache_layout = False, source_context = None):
+    """Saves chunk requests of the whole run to `queue_path`, to be translated by `--queue_worker` processes"""
+    from utils.work_queue import WorkQueue
+    queue = WorkQueue(queue_path)
+    if sum(queue.counts().values()) > 0:
+        print(f"Queue {queue_path} is already planned, remove it to plan again")
+        exit(1)
+    tasks = []
+    key_mappings = dict()
+    for dst_lang in dst_langs:
+        context_langs = source_context.languages(src_langs, dst_lang) if source_context else None
+        elems, key_mappings[dst_lang] = group_multiple_inputs(original_list, src_langs, [dst_lang], context_langs)
+        for (elem, plural) in elems:
+            elem = order_entries(gpt, elem, prioritize=True) # workers may run with a budget
+            prompt, instruction = request_prompts(app_description, dst_lang, plural, cache_layout)
+            count_prompt = prompt if instruction is None else f"{prompt}\n{instruction}"
+            chunk_prompt = glossary.chunk_prompt(dst_lang) if glossary else None
+            routes = [(gpt, elem)]
+            if router:
+                simple, strong = router.split(elem)
+                routes = [(router.simple_gpt, simple), (gpt, strong)]
+            for (route_gpt, route_elem) in routes:
+                if not route_elem: continue
+                chunks = route_gpt.split_json(count_prompt, route_elem, chunk_prompt)
+                if chunks is None: continue
+                for chunk in chunks:
+                    extra_prompt = chunk_prompt(chunk) if chunk_prompt else ""
+                    if instruction is None:
+                        tasks.append((dst_lang, route_gpt.model, prompt + extra_prompt, None, chunk))
+                    else:
+                        tasks.append((dst_lang, route_gpt.model, prompt, instruction + extra_prompt, chunk))
+    queue.set_meta("plan", {
+        "src_paths": src_paths,
+        "out_paths": [os.path.abspath(path) for path in out_file_path],
+        "src_langs": src_langs,
+        "dst_langs": dst_langs,
+        "key_mappings": key_mappings,
+        "reuse_state": reuse_state,
+    })
+    queue.add_tasks(tasks)
+    print(f"Planned {len(tasks)} requests to {queue_path}")
+
+def run_queue_worker(queue_path: str, gpt_for_model, max_workers: int, lease_seconds: float, poll_seconds: float = 5):
+    """Claims and translates requests until the queue is empty, `gpt_for_model(model)` returns GPTWrapper"""
+    import socket, time, concurrent.futures
+    from utils.work_queue import WorkQueue
+    queue = WorkQueue(queue_path)
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+
+    def work(thread_idx):
+        done_count = 0
+        while True:
+            task = queue.claim(f"{owner}:{thread_idx}", lease_seconds)
+            if task is None:
+                if queue.counts()["pending"] == 0:
+                    return done_count
+                time.sleep(poll_seconds) # other workers are busy with the rest, their leases may expire
+                continue
+            task_id, model, prompt, instruction, chunk = task
+            try:
+                result = gpt_for_model(model).process_chunk(prompt, chunk, instruction=instruction)
+            except Exception as e:
+                print(f"Request {task_id} failed: {e}")
+                queue.release(task_id)
+                continue
+            if result is None:
+                # budget is exhausted, the request is left for workers with their own budget
+                queue.unclaim(task_id)
+                return done_count
+            queue.complete(task_id, result)
+            done_count += 1
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        done_count = sum(executor.map(work, range(max_workers)))
+    print(f"Worker {owner} finished {done_count} requests")
+
+def merge_queue(queue_path: str):
+    """Applies all finished requests of the queue to output files"""
+    from utils.work_queue import WorkQueue
+    queue = WorkQueue(queue_path)
+    plan = queue.get_meta("plan")
+    if plan is None:
+        print(f"Queue {queue_path} is not planned")
+        exit(1)
+    counts = queue.counts()
+    if counts["pending"] or counts["failed"]:
+        print(f"Warning: {counts['pending']} requests are not finished and {counts['failed']} failed, merging partial results")
+
+    original_list = [load(path) for path in plan["src_paths"]]
+    if plan["reuse_state"]:
+        index = build_translation_index(original_list, plan["src_langs"])
+        for original in original_list:
+            fill_from_index(original, index, plan["src_langs"], plan["dst_langs"], plan["reuse_state"])
+    merged_out = {lang: dict() for lang in plan["dst_langs"]}
+    for (lang, result) in queue.results():
+        merged_out[lang].update(result)
+    for (lang, data) in merged_out.items():
+        for (idx, file_data) in enumerate(ungroup_outputs(data, plan["key_mappings"][lang])):
+            if len(file_data) == 0: continue
+            update_with_translations(original_list[idx], file_data, force_update=True)
+    for (idx, original) in enumerate(original_list):
+        save(plan["out_paths"][idx], original)
+    print(f"Merged {counts['done']} requests into {len(original_list)} files")
+    print_left_untranslated(original_list, plan["src_langs"], plan["dst_langs"])
+
+def print_run_report(gpts: list, router = None, on_budget_exhausted = None, by_model = False):
+    """Usage and statistics of the run, `gpts` share cassette, transport and budget"""
+    gpt = gpts[0]
+    for model_gpt in gpts:
+        model_text = f" with {model_gpt.model}" if by_model else ""
+        print(f"Tokens spended{model_text} in {model_gpt.total_in_tokens} (cached {model_gpt.total_cached_tokens}) / out {model_gpt.total_out_tokens}")
+    if router:
+        print(router.report(gpt.model))
+    if gpt.hedger:
+        print(f"Hedging: {gpt.hedger.description()}")
+    if gpt.chunker:
+        print(f"Adaptive chunks: {gpt.chunker.description()}")
+    if gpt.cassette:
+        print(f"Cassette: {gpt.cassette.description()}")
+    if gpt.transport:
+        print(f"Connections: {gpt.transport.description()}")
+    if gpt.budget:
+        print(f"Budget: {gpt.budget.description()}")
+        if gpt.budget.exhausted and on_budget_exhausted:
+            on_budget_exhausted()
+    PROFILER.finish()
+    print("Done")
+
+def main(argv=None, gpt_factory=GPTWrapper):
+    args = parse_arguments(argv)
+    start_profiling(args)
+    if args.merge_queue:
+        merge_queue(args.merge_queue)
+        PROFILER.finish()
+        print("Done")
+        return
+
+    cassette = create_cassette(args)
+    priority_languages = args.priority_languages.split(",") if args.priority_languages else []
+    budget = Budget(args.max_cost, args.max_tokens) if args.max_cost is not None or args.max_tokens is not None else None
+    # hedged requests are duplicated while in flight
+    transport = create_transport(args, args.max_workers * (2 if args.hedge_percentile else 1))
+    # one limit for requests of all models
+    rate_limiter = RateLimiter(args.requests_per_minute) if args.requests_per_minute else None
+    def create_gpt(model):
+        model_gpt = gpt_factory(api_key=args.gpt_api_key, 
+                                model=model, 
+                                max_input_token_count=args.max_input_token_count)
+        model_gpt.rate_limiter = rate_limiter
+        model_gpt.max_workers = args.max_workers
+        model_gpt.stream = args.stream
+        model_gpt.chunker = AdaptiveChunker(args.max_chunk_seconds, args.chunk_overhead_ratio) if args.adaptive_chunks else None
+        model_gpt.hedger = Hedger(args.hedge_percentile, args.hedge_max_ratio) if args.hedge_percentile else None
+        model_gpt.cassette = cassette
+        model_gpt.budget = budget
+        model_gpt.response_schema = translation_schema if args.structured_outputs else None
+        model_gpt.hoist_comments = args.hoist_comments
+        model_gpt.transport = transport
+        if args.structured_outputs and model not in structured_output_models:
+            print(f"{model} doesn't support structured outputs, plain JSON object is requested")
+        if budget and args.max_cost is not None and model not in gpt_prices:
+            print(f"No price for {model}, its requests are not counted in --max_cost")
+        return model_gpt
+
+    gpt = create_gpt(args.gpt_model)
     if not gpt: exit
+    if args.queue_worker:
+        # queue may have requests for the routed model too
+        worker_gpts = {gpt.model: gpt}
+        def gpt_for_model(model):
+            with gpt.lock:
+                if model not in worker_gpts:
+                    worker_gpts[model] = create_gpt(model)
+                return worker_gpts[model]
+        run_queue_worker(args.queue_worker, gpt_for_model, args.max_workers, args.lease_seconds)
+        print_run_report(list(worker_gpts.values()), by_model=True)
+        return
+
+    glossary = Glossary(args.glossary_dir) if args.glossary_dir else None
+    variants = create_variants(args)
+    source_context = SourceContext(args.source_context, parse_related_languages(args.related_languages or ""))
+    router = None
+    if args.route_simple_model:
+        router = ModelRouter(create_gpt(args.route_simple_model), args.route_max_length, args.route_max_placeholders, args.route_comments_to_strong)
+        print(f"Routing: {router.description()}")
+
+    if args.manifest:
+        reuse_state = args.reuse_state if args.reuse_translations else None
+        localize_manifest(gpt, args.manifest, args.max_workers, glossary, router, reuse_state, priority_languages, args.cache_layout, source_context)
+        print_run_report([gpt], router)
+        return
     
     # Prepare file paths
-    original_list = []
-    src_paths = []
-    for file_name in args.files:
-        full_path = os.path.join(os.getcwd(), file_name)
-        src_paths.append(full_path)
-        original_list += [json.load(open(full_path))]
+    src_paths = [os.path.join(os.getcwd(), file_name) for file_name in args.files]
+    original_list, scans = load_catalogs(src_paths, args.max_workers)
     
-    # Auto-detect languages if not provided
-    if args.localize_from is None or args.localize_to is None:
-        print("Auto-detecting languages from files...")
-        all_languages, source_language = extract_languages_from_files(src_paths)
-        
-        if args.localize_from is None:
-            if source_language:
-                src_langs = [source_language]
-                print(f"Using source language: {source_language}")
-            else:
-                print("Warning: Could not detect source language, using 'en' as default")
-                src_langs = ["en"]
-        else:
-            src_langs = args.localize_from.split(",")
-        
-        if args.localize_to is None:
-            # Use all languages except source languages
-            dst_langs = [lang for lang in all_languages if lang not in src_langs]
-            if dst_langs:
-                print(f"Auto-detected target languages: {', '.join(sorted(dst_langs))}")
-            else:
-                print("Warning: No target languages found in files")
-                exit(1)
-        else:
-            dst_langs = args.localize_to.split(",")
-    else:
-        src_langs = args.localize_from.split(",")
-        dst_langs = args.localize_to.split(",")
+    src_langs, dst_langs = resolve_languages(scans, args.localize_from, args.localize_to)
+    if not dst_langs:
+        exit(1)
+    dst_langs = prioritize_languages(dst_langs, priority_languages)
+    missing = missing_slots(scans, src_langs, dst_langs)
+    print("Missing translations: " + ", ".join(f"{lang} {count}" for (lang, count) in missing.items()))
+    # languages without missing slots don't need grouping, watch mode still checks them for new keys
+    translate_langs = [lang for lang in dst_langs if missing[lang] > 0]
+    variant_langs = []
+    if variants:
+        translate_langs, variant_langs = variants.split(translate_langs, variants.base_languages(src_langs, dst_langs))
+        if variant_langs:
+            print(f"Regional variants: {variants.description()}")
+
+    if args.compare_source_context:
+        compare_source_context(gpt, original_list, src_langs, translate_langs, source_context)
+        return
 
     out_file_path = args.out_files
     if not out_file_path:
@@ -304,27 +1265,30 @@ def main():
         print("Input and output files not matched")
         exit(0)
 
-    pbar = tqdm(dst_langs)
-    for dst_lang in pbar:
-        pbar.set_description_str(f"Translating to {dst_lang}")
-        elems, key_mappings = group_multiple_inputs(original_list, src_langs, [dst_lang])
-        merged_out = {}
-        for (elem, plural) in elems:
-            prompt = generate_prompt(app_description=args.app_description, lang_code=dst_lang, plural=plural)
-            out = gpt.process_json(prompt, elem)
-            merged_out.update(out)
-        ungrouped_data = ungroup_outputs(merged_out, key_mappings)
-        for (idx, original) in enumerate(original_list):
-            if idx >= len(ungrouped_data):
-                continue
-            data = ungrouped_data[idx]
-            if len(data) == 0:
-                continue
-            update_with_translations(original, data, force_update=True)
-            save(out_file_path[idx], original)
+    if args.reuse_translations:
+        reuse_translations(original_list, out_file_path, src_langs, dst_langs, args.reuse_state)
+
+    if args.plan_queue:
+        reuse_state = args.reuse_state if args.reuse_translations else None
+        plan_queue(gpt, args.plan_queue, original_list, src_paths, out_file_path, src_langs, translate_langs, 
+                   args.app_description, glossary, router, reuse_state, args.cache_layout, source_context)
+        PROFILER.finish()
+        print("Done")
+        return
+
+    def on_translated(idx, data):
+        update_with_translations(original_list[idx], data, force_update=True)
+        save(out_file_path[idx], original_list[idx])
+
+    translate_catalogs(gpt, original_list, src_langs, translate_langs, args.app_description, on_translated, glossary, router, 
+                       args.cache_layout, source_context)
+    if variant_langs:
+        derive_variants(gpt, original_list, variant_langs, variants, on_translated)
     
-    print(f"Tokens spended in {gpt.total_in_tokens} / out {gpt.total_out_tokens}")
-    print("Done")
+    if args.watch:
+        watch_catalogs(gpt, src_paths, out_file_path, src_langs, dst_langs, args, glossary, router, source_context, variants)
+    
+    print_run_report([gpt], router, lambda: print_left_untranslated(original_list, src_langs, dst_langs))
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,42 @@
+import json
+from types import SimpleNamespace
+import pytest
+from utils.gpt_utils import GPTWrapper
+from utils.tokenizer import ApproximateEncoding
+
+class FakeCompletions:
+    """`client.chat.completions` answering with `respond(json_input) -> (output text, finish_reason)`"""
+    def __init__(self, respond, piece_size: int = 7):
+        self.respond = respond
+        self.piece_size = piece_size
+        self.inputs = []
+
+    def create(self, model, temperature, response_format, messages, stream=False, stream_options=None):
+        json_input = json.loads(messages[1]["content"])
+        self.inputs.append(json_input)
+        text, finish_reason = self.respond(json_input)
+        if not stream:
+            message = SimpleNamespace(content=text)
+            return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason=finish_reason)], usage=None)
+        pieces = [text[idx:idx + self.piece_size] for idx in range(0, len(text), self.piece_size)]
+        chunks = [SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=piece), finish_reason=None)])
+                  for piece in pieces]
+        chunks.append(SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=None), finish_reason=finish_reason)]))
+        return iter(chunks)
+
+def translate(json_input: dict) -> dict:
+    return {key: {lang: f"{lang}:{entry['en']}" for (lang, val) in entry.items() if val is None}
+            for (key, entry) in json_input.items()}
+
+@pytest.fixture
+def make_gpt():
+    """GPTWrapper without network and tokenizer files, `respond` defaults to a complete translation"""
+    def make(respond=None, **attributes):
+        gpt = GPTWrapper("test", "gpt-4.1")
+        gpt._enc = ApproximateEncoding()
+        completions = FakeCompletions(respond or (lambda json_input: (json.dumps(translate(json_input)), "stop")))
+        gpt._client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        for (name, value) in attributes.items():
+            setattr(gpt, name, value)
+        return gpt
+    return make
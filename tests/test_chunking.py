@@ -0,0 +1,62 @@
+import heapq
+import pytest
+from utils.chunking import AdaptiveChunker, MAX_SECONDS_PER_TOKEN
+
+def chunker(max_chunk_seconds: float = 60.0) -> AdaptiveChunker:
+    # overhead floor is 1.5 * 0.8 / (0.2 * 0.02) = 300 tokens
+    return AdaptiveChunker(max_chunk_seconds, overhead_ratio=0.2, overhead=1.5, seconds_per_token=0.02)
+
+def test_overhead_floor_for_small_work():
+    assert chunker().target_output_tokens(10, 4) == 300
+    assert chunker().target_output_tokens(1000, 4) == 300
+
+def test_latency_limit_wins_over_overhead_floor():
+    # (2 - 1.5) / 0.02 = 25 tokens
+    assert chunker(2.0).target_output_tokens(10000, 4) == 25
+
+def test_share_of_whole_work_with_chunks_in_flight():
+    assert chunker().target_output_tokens(8000, 4) == 2000
+    # last chunks are sized like the ones already requested
+    assert chunker().target_output_tokens(100, 4, in_flight_tokens=3000) == 775
+    # (60 - 1.5) / 0.02 = 2925 tokens
+    assert chunker().target_output_tokens(100000, 4) == 2925
+
+def test_least_squares_fit():
+    c = chunker()
+    for tokens in (100, 200, 400, 800):
+        c.observe(1.0 + 0.01 * tokens, tokens)
+    assert c.overhead == pytest.approx(1.0)
+    assert c.seconds_per_token == pytest.approx(0.01)
+
+def test_estimates_are_clamped():
+    c = chunker()
+    c.observe(10000.0, 1)
+    assert c.seconds_per_token <= MAX_SECONDS_PER_TOKEN
+    assert c.overhead <= c.max_chunk_seconds / 2
+    assert c.target_output_tokens(1000, 4) >= 1
+
+def simulate(entries: int, workers: int, entry_tokens: int = 10, overhead: float = 0.8, seconds_per_token: float = 0.015) -> list:
+    """Chunk sizes in entries, with requests finishing in order of modeled latency"""
+    c = AdaptiveChunker(60.0, 0.2)
+    remaining, now, sizes, events = entries * entry_tokens, 0.0, [], []
+    while remaining > 0 or events:
+        while len(events) < workers and remaining > 0:
+            target = c.target_output_tokens(remaining, workers, sum(tokens for (_, _, tokens) in events))
+            tokens = min(max(target // entry_tokens, 1) * entry_tokens, remaining)
+            remaining -= tokens
+            sizes.append(tokens // entry_tokens)
+            latency = overhead + seconds_per_token * tokens
+            heapq.heappush(events, (now + latency, latency, tokens))
+        (now, latency, tokens) = heapq.heappop(events)
+        c.observe(latency, tokens)
+    return sizes
+
+def test_tail_does_not_degenerate():
+    sizes = simulate(2000, 4)
+    assert sum(sizes) == 2000
+    assert len(sizes) < 20
+    assert min(sizes[:-1]) >= 100
+
+def test_small_catalog_is_not_split_into_single_entries():
+    # 6 entries in 4 languages
+    assert len(simulate(6, 4, entry_tokens=40)) == 1
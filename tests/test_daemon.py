@@ -0,0 +1,62 @@
+import json, os, socket, threading
+import pytest
+import localize_daemon
+from utils.tokenizer import ApproximateEncoding
+
+@pytest.fixture
+def socket_path(tmp_path):
+    return str(tmp_path / "d.sock")
+
+def test_missing_and_stale_socket_are_replaced(socket_path):
+    assert localize_daemon.remove_stale_socket(socket_path)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.bind(socket_path) # closed without removal, like a killed daemon
+    assert localize_daemon.remove_stale_socket(socket_path)
+    assert not os.path.exists(socket_path)
+
+def test_running_daemon_and_other_files_are_kept(socket_path, tmp_path):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.bind(socket_path)
+        sock.listen()
+        assert not localize_daemon.remove_stale_socket(socket_path)
+    other = tmp_path / "file.txt"
+    other.write_text("data")
+    assert not localize_daemon.remove_stale_socket(str(other))
+    assert other.exists()
+
+@pytest.fixture
+def server(socket_path, monkeypatch):
+    def job(argv, gpt_factory):
+        print("args", *argv)
+    monkeypatch.setattr(localize_daemon, "load_job_modules", lambda: {"strings": job})
+    monkeypatch.setattr(localize_daemon, "load_encoding", ApproximateEncoding)
+    server = localize_daemon.LocalizerServer(socket_path, 10)
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def send(socket_path: str, line: bytes) -> list:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(line)
+        return [json.loads(reply) for reply in sock.makefile("r", encoding="utf-8")]
+
+@pytest.mark.parametrize("line", [b"not json\n", b"\xff\n", b"[]\n", b'{"job": "unknown"}\n', b"\n"])
+def test_malformed_request_exits_with_2(server, socket_path, line):
+    assert send(socket_path, line)[-1] == {"exit": 2}
+
+def test_job_output_and_exit(server, socket_path):
+    assert localize_daemon.run_job(socket_path, "strings", ["a", "b"]) == 0
+    replies = send(socket_path, (json.dumps({"job": "strings", "argv": ["x"]}) + "\n").encode("utf-8"))
+    assert "".join(reply.get("out", "") for reply in replies) == "args x\n"
+    assert replies[-1] == {"exit": 0}
+
+def test_pooled_wrappers_share_tokenizer():
+    encoding = ApproximateEncoding()
+    pool = localize_daemon.GPTPool(10, encoding)
+    gpt = pool(api_key="test", model="gpt-4.1")
+    other = pool(api_key="test", model="gpt-4.1-mini")
+    assert gpt is pool(api_key="test", model="gpt-4.1")
+    assert gpt.enc is encoding and other.enc is encoding
+    assert gpt.cache is not other.cache
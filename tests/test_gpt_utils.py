@@ -0,0 +1,43 @@
+import json
+import pytest
+from conftest import translate
+
+INPUT = {f"key {idx}": {"en": f"Text {idx}", "de": None} for idx in range(6)}
+EXPECTED = translate(INPUT)
+
+def cut_off_once(length):
+    """First response is cut off after `length(text)` characters, next ones are complete"""
+    calls = []
+    def respond(json_input):
+        text = json.dumps(translate(json_input))
+        calls.append(json_input)
+        if len(calls) == 1:
+            return text[:length(text)], "length"
+        return text, "stop"
+    return respond
+
+def test_stream_matches_plain_request(make_gpt):
+    assert make_gpt(stream=True).process_json("prompt", INPUT) == EXPECTED
+    assert make_gpt().process_json("prompt", INPUT) == EXPECTED
+
+def test_cut_off_stream_requests_only_remainder(make_gpt):
+    entries = []
+    gpt = make_gpt(cut_off_once(lambda text: len(text) // 2), stream=True)
+    assert gpt.process_json("prompt", INPUT, on_entry=lambda key, val: entries.append(key)) == EXPECTED
+    inputs = gpt.client.chat.completions.inputs
+    assert len(inputs) == 2
+    assert 0 < len(inputs[1]) < len(INPUT)
+    # entries of the cut off response are received first
+    received = entries[:len(INPUT) - len(inputs[1])]
+    assert set(received) | set(inputs[1]) == set(INPUT)
+    assert sorted(entries) == sorted(INPUT)
+
+def test_cut_off_before_first_entry_requests_halves(make_gpt):
+    gpt = make_gpt(cut_off_once(lambda text: 5), stream=True)
+    assert gpt.process_json("prompt", INPUT) == EXPECTED
+    assert [len(json_input) for json_input in gpt.client.chat.completions.inputs] == [6, 3, 3]
+
+def test_single_entry_cut_off_before_first_entry_raises(make_gpt):
+    gpt = make_gpt(lambda json_input: ('{"key', "length"), stream=True)
+    with pytest.raises(ValueError):
+        gpt.process_json("prompt", {"key": {"en": "Text", "de": None}})
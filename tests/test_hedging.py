@@ -0,0 +1,84 @@
+import json, threading, time
+import pytest
+from conftest import translate
+from utils.budget import Budget
+from utils.chunking import AdaptiveChunker
+from utils.gpt_utils import ResponseCache
+from utils import hedging
+from utils.hedging import Hedger
+
+INPUT = {f"key {idx}": {"en": f"Text {idx}", "de": None} for idx in range(4)}
+
+def eager_hedger() -> Hedger:
+    # every request is slower than the measured latency, so it's duplicated
+    hedger = Hedger(percentile=50, max_ratio=1.0, min_samples=1)
+    hedger.latencies = [1e-6]
+    return hedger
+
+def slow_first(delay: float = 0.3):
+    calls = []
+    lock = threading.Lock()
+    def respond(json_input):
+        with lock:
+            calls.append(json_input)
+            first = len(calls) == 1
+        if first: time.sleep(delay)
+        return json.dumps(translate(json_input)), "stop"
+    return respond
+
+def test_threshold_is_per_output_token():
+    hedger = Hedger(percentile=50, min_samples=2)
+    assert hedger.threshold(100) is None
+    hedger.latencies = [0.01, 0.02, 0.03]
+    assert hedger.threshold(100) == pytest.approx(2.0)
+    assert hedger.threshold(10) == pytest.approx(0.2)
+
+def test_only_first_commit_wins(monkeypatch):
+    created = []
+    class RecordedAttempt(hedging.HedgedAttempt):
+        def __init__(self, race):
+            super().__init__(race)
+            created.append(self)
+    monkeypatch.setattr(hedging, "HedgedAttempt", RecordedAttempt)
+    committed = []
+    def request(attempt):
+        is_primary = attempt is created[0]
+        if is_primary: time.sleep(0.2)
+        if not attempt.commit(): return None
+        committed.append(is_primary)
+        return is_primary
+    hedger = eager_hedger()
+    assert hedger.run(request, output_tokens=10) is False
+    time.sleep(0.3)
+    assert committed == [False]
+    assert created[0].lost()
+    assert (hedger.hedged, hedger.hedge_wins) == (1, 1)
+
+def test_duplicate_is_not_sent_over_max_ratio():
+    hedger = eager_hedger()
+    hedger.max_ratio = 0.0
+    assert hedger.run(lambda attempt: attempt.commit()) is True
+    assert hedger.hedged == 0
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_loser_has_no_side_effects(make_gpt, stream):
+    plain = make_gpt()
+    plain.process_json("prompt", INPUT)
+
+    budget = Budget(max_cost=100.0)
+    chunker = AdaptiveChunker()
+    entries = []
+    gpt = make_gpt(slow_first(), hedger=eager_hedger(), budget=budget, chunker=chunker, stream=stream, cache=ResponseCache())
+    gpt.max_input_token_count = 100000
+    assert gpt.process_json("prompt", INPUT, on_entry=lambda key, val: entries.append(key)) == translate(INPUT)
+    time.sleep(0.5) # loser finishes
+    assert len(gpt.client.chat.completions.inputs) == 2
+    assert gpt.hedger.hedge_wins == 1
+    assert gpt.total_out_tokens == plain.total_out_tokens
+    assert gpt.total_in_tokens == 2 * plain.total_in_tokens
+    assert budget.spent_cost == pytest.approx(Budget.cost(gpt.model, 2 * plain.total_in_tokens, plain.total_out_tokens))
+    assert len(chunker.samples) == 1
+    assert len(gpt.cache) == 1
+    if stream:
+        # streamed loser is closed before its entries arrive
+        assert sorted(entries) == sorted(INPUT)
@@ -0,0 +1,73 @@
+import json, os
+import pytest
+from utils import json_io
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+def fixture_text(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+def stdlib_xcode(data) -> str:
+    return json.dumps(data, indent=2, ensure_ascii=False, separators=(',', ' : '), sort_keys=True)
+
+def stdlib_compact(data) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+# metadata request like `read_metadata` builds it
+METADATA_REQUEST = {
+    "name": {"en-US": "Video Player", "ru": "Видео Плеер", "de-DE": None},
+    "description": {"en-US": "Play any video.\n\n• \"Fast\" & simple\n• 4K/HDR ✓", "de-DE": None},
+    "keywords": {"en-US": "video,player,mp4,mkv", "de-DE": None},
+}
+
+@pytest.fixture(params=["orjson", "stdlib"])
+def backend(request, monkeypatch):
+    if request.param == "orjson":
+        if json_io.orjson is None:
+            pytest.skip("orjson is not installed")
+    else:
+        monkeypatch.setattr(json_io, "orjson", None)
+    return request.param
+
+def test_xcstrings_golden(backend):
+    text = fixture_text("Localizable.xcstrings")
+    data = json_io.loads(text)
+    assert data == json.loads(text)
+    assert json_io.dumps_xcode(data) == text
+    assert json_io.dumps_xcode(data) == stdlib_xcode(data)
+
+def test_metadata_state_golden(backend):
+    text = fixture_text("localize_metadata_state.json")
+    data = json_io.loads(text)
+    assert json_io.dumps_xcode(data) == stdlib_xcode(data)
+
+def test_compact_matches_stdlib(backend):
+    catalog = json_io.loads(fixture_text("Localizable.xcstrings"))
+    for data in (METADATA_REQUEST, catalog, catalog["strings"]["%@ files"]):
+        assert json_io.dumps_compact(data) == stdlib_compact(data)
+
+@pytest.mark.parametrize("data", [
+    {"a": 1e19, "b": 1.5, "c": -0.0},      # floats, formatted differently by orjson
+    {"a": [1.0, 2e-7], "b": [[3.25]]},
+    {"key": ": starts like separator"},     # string looks like key separator
+    {"key": "x\": y", "other": "\": "},
+    {"k": "line\n\": value"},
+    {"k": "  \x7f\x00\x1f"},      # characters escaped differently
+    {"k": 2 ** 70},                         # bigger than 64 bit
+    {1: "non string key"},
+    [],
+    {},
+    "scalar",
+])
+def test_xcode_edge_cases(backend, data):
+    assert json_io.dumps_xcode(data) == stdlib_xcode(data)
+
+def test_loads_big_integer(backend):
+    assert json_io.loads("[123456789012345678901234567890]") == [123456789012345678901234567890]
+
+def test_compact_floats_may_differ():
+    # documented difference, requests and cache keys don't depend on float formatting
+    if json_io.orjson is None:
+        pytest.skip("orjson is not installed")
+    assert json.loads(json_io.dumps_compact({"a": 1e19})) == {"a": 1e19}
@@ -0,0 +1,52 @@
+import json
+import pytest
+from utils.json_stream import IncrementalObjectParser
+
+TEXT = json.dumps({
+    "plain": {"de": "Hallo"},
+    "quotes": {"de": "Sag \"ja\", bitte } {"},
+    "unicode": {"ja": "こんにちは ✓"},
+    "plural": {"de": {"one": "%d Datei", "other": "%d Dateien"}},
+    "number": 12345,
+    "float": -1.5e3,
+    "flags": [True, False, None],
+}, ensure_ascii=False)
+
+def feed_in_pieces(text: str, size: int):
+    parser = IncrementalObjectParser()
+    entries = []
+    for idx in range(0, len(text), size):
+        entries += parser.feed(text[idx:idx + size])
+    return parser, entries
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+def test_pieces_give_same_object(size):
+    parser, entries = feed_in_pieces(TEXT, size)
+    assert dict(entries) == json.loads(TEXT)
+    assert [key for (key, _) in entries] == list(json.loads(TEXT))
+    assert parser.done
+
+def test_entry_is_returned_as_soon_as_complete():
+    parser = IncrementalObjectParser()
+    assert parser.feed('{"a": {"de": "x"}, "b": {"de": "y') == [("a", {"de": "x"})]
+    assert parser.feed('"}') == [("b", {"de": "y"})]
+    assert not parser.done
+    assert parser.feed('}') == []
+    assert parser.done
+
+def test_number_and_literal_wait_for_next_piece():
+    parser = IncrementalObjectParser()
+    assert parser.feed('{"a": 12') == []
+    assert parser.feed('3, "b": tr') == [("a", 123)]
+    assert parser.feed('ue}') == [("b", True)]
+
+def test_cut_off_keeps_completed_entries():
+    text = json.dumps({"a": "1", "b": "2", "c": "3"})
+    parser, entries = feed_in_pieces(text[:-8], 3)
+    assert dict(entries) == {"a": "1", "b": "2"}
+    assert not parser.done
+
+@pytest.mark.parametrize("text", ['["a"]', '{"a" "b"}', '{"a": x}'])
+def test_invalid_json_raises(text):
+    with pytest.raises(ValueError):
+        IncrementalObjectParser().feed(text)
@@ -0,0 +1,23 @@
+from types import SimpleNamespace
+import pytest
+from localize_strings import order_entries
+
+ELEM = {
+    "long": {"en": "A much longer text", "comment": "Settings", "de": None},
+    "short": {"en": "OK", "comment": "Button", "de": None},
+    "medium": {"en": "Save file", "comment": "Settings", "de": None},
+    "other": {"en": "Cancel it", "comment": "Button", "de": None},
+}
+
+@pytest.mark.parametrize("budget, hoist_comments, prioritize, expected", [
+    (None, False, None, ["long", "short", "medium", "other"]),
+    (object(), False, None, ["short", "medium", "other", "long"]),
+    (None, True, None, ["long", "medium", "short", "other"]),
+    # comment groups in place of their shortest entry
+    (object(), True, None, ["short", "other", "medium", "long"]),
+    (None, True, True, ["short", "other", "medium", "long"]),
+    (object(), False, False, ["long", "short", "medium", "other"]),
+])
+def test_order_entries(budget, hoist_comments, prioritize, expected):
+    gpt = SimpleNamespace(budget=budget, hoist_comments=hoist_comments)
+    assert list(order_entries(gpt, ELEM, prioritize)) == expected
@@ -0,0 +1,11 @@
+import os, subprocess, sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["openai", "tiktoken", "tqdm"]
+
+@pytest.mark.parametrize("module", ["localize_strings", "localize_metadata", "localize_release_notes", "localize_daemon"])
+def test_scripts_import_heavy_modules_lazily(module):
+    code = f"import sys, {module}; print(','.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ""
@@ -0,0 +1,94 @@
+from types import SimpleNamespace
+import pytest
+from utils import work_queue
+from utils.work_queue import WorkQueue
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(work_queue, "time", SimpleNamespace(time=clock.time))
+    return clock
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    queue = WorkQueue(str(tmp_path / "queue.db"), max_attempts=3, retry_seconds=30)
+    queue.add_tasks([("de", "gpt-4.1", "prompt", None, {"key": {"en": "One", "de": None}}),
+                     ("fr", "gpt-4.1", "prompt", "instruction", {"key": {"en": "One", "fr": None}})])
+    return queue
+
+def leave_only_first_task(queue):
+    queue.connection.execute("UPDATE tasks SET status = 'done', result = '{}' WHERE id = 2")
+
+def attempts(queue, task_id: int) -> int:
+    return queue.connection.execute("SELECT attempts FROM tasks WHERE id = ?", (task_id,)).fetchone()[0]
+
+def test_claim_leases_tasks_in_order(queue):
+    first = queue.claim("a", 60)
+    assert first == (1, "gpt-4.1", "prompt", None, {"key": {"en": "One", "de": None}})
+    assert queue.claim("b", 60)[0] == 2
+    assert queue.claim("c", 60) is None
+    assert queue.counts() == {"pending": 2, "done": 0, "failed": 0}
+
+def test_expired_lease_is_claimed_again(queue, clock):
+    assert queue.claim("a", 60)[0] == 1
+    assert queue.claim("b", 60)[0] == 2
+    clock.now += 61
+    assert queue.claim("c", 60)[0] == 1
+    assert attempts(queue, 1) == 2
+
+def test_first_result_wins(queue):
+    queue.claim("a", 60)
+    queue.complete(1, {"key": {"de": "Eins"}})
+    queue.complete(1, {"key": {"de": "Other"}})
+    assert queue.results() == [("de", {"key": {"de": "Eins"}})]
+    assert queue.counts() == {"pending": 1, "done": 1, "failed": 0}
+
+def test_released_task_waits_and_goes_after_others(queue, clock):
+    assert queue.claim("a", 60)[0] == 1
+    queue.release(1)
+    assert queue.claim("a", 60)[0] == 2 # not the failed one again
+    assert queue.claim("a", 60) is None
+    queue.complete(2, {})
+    clock.now += 31
+    assert queue.claim("a", 60)[0] == 1
+    queue.release(1)
+    clock.now += 31
+    assert queue.claim("a", 60) is None # second retry waits 60 seconds
+    clock.now += 30
+    assert queue.claim("a", 60)[0] == 1
+
+def test_release_fails_task_after_max_attempts(queue, clock):
+    leave_only_first_task(queue)
+    for _ in range(3):
+        clock.now += 1000
+        assert queue.claim("a", 60)[0] == 1
+        queue.release(1)
+    assert queue.counts() == {"pending": 0, "done": 1, "failed": 1}
+    clock.now += 1000
+    assert queue.claim("a", 60) is None
+
+def test_expired_lease_fails_task_after_max_attempts(queue, clock):
+    leave_only_first_task(queue)
+    for _ in range(3):
+        assert queue.claim("crashed", 60)[0] == 1
+        clock.now += 61
+    assert queue.claim("a", 60) is None
+    assert queue.counts() == {"pending": 0, "done": 1, "failed": 1}
+
+def test_unclaim_does_not_count_attempt(queue):
+    assert queue.claim("a", 60)[0] == 1
+    queue.unclaim(1)
+    assert attempts(queue, 1) == 0
+    assert queue.claim("b", 60)[0] == 1
+
+def test_meta_round_trip(queue):
+    assert queue.get_meta("plan") is None
+    queue.set_meta("plan", {"src_paths": ["Localizable.xcstrings"], "ü": 1})
+    assert queue.get_meta("plan") == {"src_paths": ["Localizable.xcstrings"], "ü": 1}
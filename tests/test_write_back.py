@@ -0,0 +1,49 @@
+import os
+import localize_strings
+
+SOURCE = {
+    "sourceLanguage": "en",
+    "strings": {
+        "Hello": {"localizations": {"en": {"stringUnit": {"state": "translated", "value": "Hello"}}}},
+        "Bye": {"comment": "Button", "localizations": {"en": {"stringUnit": {"state": "translated", "value": "Bye"}}}},
+    },
+    "version": "1.0",
+}
+
+class Watcher:
+    def __init__(self):
+        self.seen = []
+
+    def mark_seen(self, path):
+        self.seen.append(path)
+
+def write_source(tmp_path) -> str:
+    src_path = str(tmp_path / "Source.xcstrings")
+    localize_strings.save(src_path, SOURCE)
+    return src_path
+
+def test_missing_out_file_starts_from_source(tmp_path):
+    src_path = write_source(tmp_path)
+    out_path = str(tmp_path / "out" / "Localizable.xcstrings")
+    os.makedirs(os.path.dirname(out_path))
+    fingerprints = localize_strings.source_fingerprints(SOURCE, ["en"])
+    watcher = Watcher()
+    written = localize_strings.write_back(out_path, src_path, {"Hello": {"de": "Hallo"}}, set(), fingerprints, ["en"], watcher)
+    assert written == 1
+    assert watcher.seen == [out_path]
+    out = localize_strings.load(out_path)
+    assert set(out["strings"]) == set(SOURCE["strings"])
+    assert out["strings"]["Hello"]["localizations"]["de"]["stringUnit"]["value"] == "Hallo"
+    assert out["strings"]["Bye"]["comment"] == "Button"
+    assert localize_strings.load(src_path) == SOURCE
+
+def test_existing_out_file_keeps_its_translations(tmp_path):
+    src_path = write_source(tmp_path)
+    out_path = str(tmp_path / "Out.xcstrings")
+    existing = {"sourceLanguage": "en", "strings": {"Bye": {"localizations": {"de": {"stringUnit": {"state": "translated", "value": "Tschüss"}}}}}}
+    localize_strings.save(out_path, existing)
+    fingerprints = localize_strings.source_fingerprints(SOURCE, ["en"])
+    localize_strings.write_back(out_path, src_path, {"Hello": {"de": "Hallo"}}, set(), fingerprints, ["en"], Watcher())
+    out = localize_strings.load(out_path)
+    assert out["strings"]["Bye"]["localizations"]["de"]["stringUnit"]["value"] == "Tschüss"
+    assert out["strings"]["Hello"]["localizations"]["de"]["stringUnit"]["value"] == "Hallo"
@@ -0,0 +1,75 @@
+import threading
+
+# USD per 1M tokens (input, output)
+gpt_prices = {
+    "gpt-4-1106-preview": (10.0, 30.0),
+    "gpt-3.5-turbo-1106": (1.0, 2.0),
+    "gpt-4o-2024-05-13": (5.0, 15.0),
+    "gpt-4o-mini-2024-07-18": (0.15, 0.6),
+    "gpt-4.1": (2.0, 8.0),
+    "gpt-4.1-mini": (0.4, 1.6),
+}
+
+class Budget:
+    """Spending limit shared by all models of a run.
+    Request is sent only if its input and estimated output still fit, once it doesn't, no more requests are sent.
+    """
+    def __init__(self, max_cost: float = None, max_tokens: int = None):
+        self.max_cost = max_cost
+        self.max_tokens = max_tokens
+        self.spent_cost = 0.0
+        self.spent_tokens = 0
+        self.reserved_cost = 0.0 # estimated output of requests in flight
+        self.reserved_tokens = 0
+        self.exhausted = False
+        self.skipped_requests = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def cost(model: str, in_tokens: int, out_tokens: int) -> float:
+        in_price, out_price = gpt_prices.get(model, (0.0, 0.0))
+        return (in_tokens * in_price + out_tokens * out_price) / 1_000_000
+
+    def __fits(self, cost: float, tokens: int) -> bool:
+        if self.max_cost is not None and self.spent_cost + self.reserved_cost + cost > self.max_cost:
+            return False
+        if self.max_tokens is not None and self.spent_tokens + self.reserved_tokens + tokens > self.max_tokens:
+            return False
+        return True
+
+    def reserve(self, model: str, in_tokens: int, out_tokens: int) -> bool:
+        """Charges input and reserves estimated output, returns False if budget is exhausted"""
+        with self.lock:
+            if not self.exhausted and not self.__fits(self.cost(model, in_tokens, out_tokens), in_tokens + out_tokens):
+                self.exhausted = True
+            if self.exhausted:
+                self.skipped_requests += 1
+                return False
+            self.spent_cost += self.cost(model, in_tokens, 0)
+            self.spent_tokens += in_tokens
+            self.reserved_cost += self.cost(model, 0, out_tokens)
+            self.reserved_tokens += out_tokens
+            return True
+
+    def release(self, model: str, out_tokens: int):
+        """Removes reservation made by `reserve` after request is finished"""
+        with self.lock:
+            self.reserved_cost -= self.cost(model, 0, out_tokens)
+            self.reserved_tokens -= out_tokens
+
+    def spend(self, model: str, in_tokens: int, out_tokens: int):
+        """Charges actual usage: received output, or input of hedged duplicates"""
+        with self.lock:
+            self.spent_cost += self.cost(model, in_tokens, out_tokens)
+            self.spent_tokens += in_tokens + out_tokens
+
+    def description(self) -> str:
+        limits = []
+        if self.max_cost is not None:
+            limits.append(f"${self.spent_cost:.4f} of ${self.max_cost:g}")
+        if self.max_tokens is not None:
+            limits.append(f"{self.spent_tokens} of {self.max_tokens} tokens")
+        text = "spent " + ", ".join(limits)
+        if self.exhausted:
+            text += f", exhausted, {self.skipped_requests} requests skipped"
+        return text
@@ -0,0 +1,82 @@
+import os, json, time, hashlib, threading
+
+class Cassette:
+    """Recorded API responses, one JSON file per request in a directory.
+    In replay mode responses are served from files with recorded latency multiplied by `latency_scale`,
+    so benchmarks run offline and get the same responses every time.
+    """
+    def __init__(self, path: str, replay: bool = False, latency_scale: float = 1.0):
+        self.path = path
+        self.replay = replay
+        self.latency_scale = latency_scale
+        self.recorded = 0
+        self.replayed = 0
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def request_key(model: str, temperature: float, prompt: str, json_input: dict) -> str:
+        """Hash of request, doesn't depend on order of input keys"""
+        canonical = json.dumps([model, temperature, prompt, json_input], ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def __file_path(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.json")
+
+    def play(self, key: str) -> dict:
+        """Returns recorded entry after its latency, with `output`, `result` and `complete` values"""
+        file_path = self.__file_path(key)
+        if not os.path.exists(file_path):
+            raise Exception(f"No recorded response for request {key} in {self.path}")
+        with open(file_path) as f:
+            entry = json.load(f)
+        time.sleep(entry["seconds"] * self.latency_scale)
+        with self.lock:
+            self.replayed += 1
+        return entry
+
+    def record(self, key: str, request: dict, output: str, result: dict, complete: bool, seconds: float):
+        entry = {
+            "request": request,
+            "output": output,
+            "result": result,
+            "complete": complete,
+            "seconds": seconds,
+        }
+        # write and rename, parallel workers may record the same request
+        tmp_path = f"{self.__file_path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.__file_path(key))
+        with self.lock:
+            self.recorded += 1
+
+    def description(self) -> str:
+        if self.replay:
+            return f"replayed {self.replayed} responses from {self.path} (latency x{self.latency_scale:g})"
+        return f"recorded {self.recorded} responses to {self.path}"
+
+def add_cassette_arguments(parser):
+    parser.add_argument('--record',
+                        type=str,
+                        default=None,
+                        help='Save every API request and response with its latency to this directory')
+
+    parser.add_argument('--replay',
+                        type=str,
+                        default=None,
+                        help='Serve API responses from directory made by --record, without network. Missing response is an error')
+
+    parser.add_argument('--replay_latency_scale',
+                        type=float,
+                        default=1.0,
+                        help='Multiply recorded latencies in replay mode, 0 answers immediately')
+
+def create_cassette(args):
+    if args.record and args.replay:
+        raise Exception("--record and --replay can't be used together")
+    if args.replay:
+        return Cassette(args.replay, replay=True, latency_scale=args.replay_latency_scale)
+    if args.record:
+        return Cassette(args.record)
+    return None
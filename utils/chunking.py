@@ -0,0 +1,67 @@
+import threading, math
+
+# bounds of latency model estimates
+MIN_SECONDS_PER_TOKEN = 0.0005
+MAX_SECONDS_PER_TOKEN = 0.5
+# least squares fit is used only if standard deviation of chunk sizes is at least this share of the mean
+MIN_TOKENS_SPREAD = 0.25
+
+class AdaptiveChunker:
+    """Picks chunk size (in estimated output tokens) from measured latency.
+    Request time is modeled as `overhead + seconds_per_token * output_tokens`.
+    """
+    def __init__(self, max_chunk_seconds: float = 60.0, overhead_ratio: float = 0.2,
+                 overhead: float = 1.5, seconds_per_token: float = 0.02, smoothing: float = 0.3):
+        self.max_chunk_seconds = max_chunk_seconds # limits tail latency and cost of a retry
+        self.overhead_ratio = overhead_ratio # max share of request time spent on fixed overhead
+        self.overhead = overhead
+        self.seconds_per_token = seconds_per_token
+        self.smoothing = smoothing
+        self.samples = []
+        self.lock = threading.Lock()
+
+    def __clamp(self):
+        # one odd request must not make chunks degenerate
+        self.seconds_per_token = min(max(self.seconds_per_token, MIN_SECONDS_PER_TOKEN), MAX_SECONDS_PER_TOKEN)
+        self.overhead = min(max(self.overhead, 0.0), self.max_chunk_seconds / 2)
+
+    def observe(self, latency: float, output_tokens: int):
+        with self.lock:
+            self.samples = (self.samples + [(output_tokens, latency)])[-50:]
+            n = len(self.samples)
+            mean_t = sum(t for (t, _) in self.samples) / n
+            var = sum((t - mean_t) ** 2 for (t, _) in self.samples)
+            # fit is ill-conditioned if chunks have nearly the same size
+            if n >= 3 and mean_t > 0 and (var / n) ** 0.5 >= MIN_TOKENS_SPREAD * mean_t:
+                # least squares fit of latency = overhead + seconds_per_token * tokens
+                mean_l = sum(l for (_, l) in self.samples) / n
+                cov = sum((t - mean_t) * (l - mean_l) for (t, l) in self.samples)
+                slope = cov / var
+                if slope > 0:
+                    self.seconds_per_token = slope
+                    self.overhead = mean_l - slope * mean_t
+                    self.__clamp()
+                    return
+            # otherwise both parts are scaled to the observed latency, so the overhead prior can go down too
+            predicted = self.overhead + self.seconds_per_token * output_tokens
+            if predicted > 0 and latency > 0:
+                scale = 1 + self.smoothing * (latency / predicted - 1)
+                self.overhead *= scale
+                self.seconds_per_token *= scale
+                self.__clamp()
+
+    def target_output_tokens(self, remaining_tokens: int, workers: int, in_flight_tokens: int = 0) -> int:
+        """Chunk size for the next request, with `remaining_tokens` of not yet planned work
+        and `in_flight_tokens` of chunks which are being requested
+        """
+        with self.lock:
+            overhead, per_token = self.overhead, self.seconds_per_token
+        # one chunk per worker of the whole work gives the shortest wall time, if chunks are not too long
+        target = math.ceil((remaining_tokens + in_flight_tokens) / max(workers, 1))
+        max_tokens = max((self.max_chunk_seconds - overhead) / per_token, 1)
+        min_tokens = overhead * (1 - self.overhead_ratio) / (self.overhead_ratio * per_token)
+        # overhead limit keeps chunks from getting smaller at the end of work, latency limit wins over it
+        return int(max(min(max(target, min_tokens), max_tokens), 1))
+
+    def description(self) -> str:
+        return f"overhead {self.overhead:.2f}s, {self.seconds_per_token * 1000:.1f}ms per output token"
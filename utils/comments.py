@@ -0,0 +1,38 @@
+COMMENTS_KEY = "_comments"
+COMMENT_ID_KEY = "comment_id"
+COMMENTS_PROMPT = f' Comments shared by several keys are in the "{COMMENTS_KEY}" table, such keys have "{COMMENT_ID_KEY}" instead of "comment". Don\'t output "{COMMENTS_KEY}" and "{COMMENT_ID_KEY}".'
+
+def hoist_comments(json_input: dict) -> dict:
+    """Moves comments repeated in several entries to a table at the start of the chunk, entries reference them by id.
+    Only comments longer than their reference are hoisted, so the payload never grows
+    """
+    counts = dict()
+    for entry in json_input.values():
+        comment = entry.get("comment") if isinstance(entry, dict) else None
+        if isinstance(comment, str):
+            counts[comment] = counts.get(comment, 0) + 1
+    table = dict()
+    ids = dict()
+    for (comment, count) in counts.items():
+        comment_id = f"c{len(table) + 1}"
+        if count > 1 and len(comment) > len(comment_id) + len(COMMENT_ID_KEY):
+            table[comment_id] = comment
+            ids[comment] = comment_id
+    if not table:
+        return json_input
+    payload = {COMMENTS_KEY: table}
+    for (key, entry) in json_input.items():
+        if isinstance(entry, dict) and entry.get("comment") in ids:
+            entry = {(COMMENT_ID_KEY if name == "comment" else name): (ids[val] if name == "comment" else val)
+                     for (name, val) in entry.items()}
+        payload[key] = entry
+    return payload
+
+def group_by_comment(json_input: dict) -> dict:
+    """Entries with the same comment go one after another, in order of the first one, so they share a chunk"""
+    groups = dict()
+    for (key, entry) in json_input.items():
+        comment = entry.get("comment") if isinstance(entry, dict) else None
+        groups.setdefault(comment if isinstance(comment, str) else None, []).append(key)
+    # entries without comment stay in place of the first of them
+    return {key: json_input[key] for keys in groups.values() for key in keys}
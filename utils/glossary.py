@@ -0,0 +1,100 @@
+import json, os
+from collections import deque
+
+def is_word_char(ch: str) -> bool:
+    # CJK and other scripts without spaces don't have word boundaries
+    return ch.isalnum() and ord(ch) < 0x3000
+
+class TermMatcher:
+    """Aho-Corasick automaton, finds all terms inside the text in one pass"""
+    def __init__(self, terms):
+        self.goto = [dict()]
+        self.fail = [0]
+        self.out = [[]]
+        for term in terms:
+            self.__add(term)
+        self.__build_fail_links()
+
+    def __add(self, term: str):
+        state = 0
+        for ch in term.lower():
+            if ch not in self.goto[state]:
+                self.goto.append(dict())
+                self.fail.append(0)
+                self.out.append([])
+                self.goto[state][ch] = len(self.goto) - 1
+            state = self.goto[state][ch]
+        self.out[state].append(term)
+
+    def __build_fail_links(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for (ch, next_state) in self.goto[state].items():
+                queue.append(next_state)
+                fail = self.fail[state]
+                while fail and ch not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[next_state] = self.goto[fail].get(ch, 0)
+                self.out[next_state] += self.out[self.fail[next_state]]
+
+    def find(self, text: str) -> set:
+        text = text.lower()
+        found = set()
+        state = 0
+        for (idx, ch) in enumerate(text):
+            while state and ch not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(ch, 0)
+            for term in self.out[state]:
+                start = idx - len(term) + 1
+                if is_word_char(term[0]) and start > 0 and is_word_char(text[start-1]):
+                    continue
+                if is_word_char(term[-1]) and idx + 1 < len(text) and is_word_char(text[idx+1]):
+                    continue
+                found.add(term)
+        return found
+
+def collect_texts(value) -> list:
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, dict):
+        return [text for (key, val) in value.items() if key != "comment" for text in collect_texts(val)]
+    return []
+
+class Glossary:
+    """Termbase with one `<lang_code>.json` file per target language: {"source term": "translation"}"""
+    def __init__(self, glossary_dir: str):
+        self.glossary_dir = glossary_dir
+        self.terms = dict()
+        self.matchers = dict()
+
+    def __load(self, lang: str):
+        if lang in self.terms: return
+        path = os.path.join(self.glossary_dir, f"{lang}.json")
+        if not os.path.exists(path):
+            path = os.path.join(self.glossary_dir, f"{lang.split('-')[0]}.json")
+        terms = dict()
+        if os.path.exists(path):
+            with open(path) as f:
+                terms = json.load(f)
+        self.terms[lang] = terms
+        self.matchers[lang] = TermMatcher(terms.keys()) if terms else None
+
+    def relevant_terms(self, lang: str, json_input: dict) -> dict:
+        self.__load(lang)
+        matcher = self.matchers[lang]
+        if matcher is None: return dict()
+        found = set()
+        for text in collect_texts(json_input):
+            found |= matcher.find(text)
+        return {term: self.terms[lang][term] for term in sorted(found)}
+
+    def chunk_prompt(self, lang: str):
+        """Returns function, which builds prompt addition with terms found in the chunk"""
+        def build(json_input: dict) -> str:
+            terms = self.relevant_terms(lang, json_input)
+            if not terms: return ""
+            terms_text = ", ".join(f'"{term}" -> "{translation}"' for (term, translation) in terms.items())
+            return f"\nUse glossary translations for terms: {terms_text}.\n"
+        return build
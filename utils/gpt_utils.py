@@ -1,7 +1,10 @@
-import json
-from openai import OpenAI
-import tiktoken
-from tqdm.auto import tqdm
+import threading, time
+from collections import OrderedDict
+from utils import json_io
+from utils.tokenizer import load_encoding, ApproximateEncoding
+from utils.json_stream import IncrementalObjectParser
+from utils.profiling import PROFILER
+from utils.comments import hoist_comments, COMMENTS_KEY, COMMENTS_PROMPT
 
 # only this models supprot json response
 gpt_models = {
@@ -13,74 +16,398 @@ gpt_models = {
     "gpt-4.1-mini": 128000
 }
 
+# models which support strict `json_schema` response format
+structured_output_models = {"gpt-4o-mini-2024-07-18", "gpt-4.1", "gpt-4.1-mini"}
+
 def split_dictionary_by_half(d):
     midpoint = len(d) // 2
     items = list(d.items())
     return dict(items[:midpoint]), dict(items[midpoint:])
 
+class RateLimiter:
+    """Spreads requests evenly, shared by all threads using the same `GPTWrapper`"""
+    def __init__(self, requests_per_minute: float):
+        self.interval = 60.0 / requests_per_minute
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            start_time = max(now, self.next_time)
+            self.next_time = start_time + self.interval
+        if start_time > now:
+            time.sleep(start_time - now)
+
+class ResponseCache:
+    """In-memory LRU cache of responses, least recently used ones are dropped after `max_entries`"""
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
 class GPTWrapper:
-    def __init__(self, api_key, model, temperature = 0.2, max_input_token_count = None):
+    def __init__(self, api_key, model, temperature = 0.2, max_input_token_count = None, requests_per_minute = None):
         if model not in gpt_models:
             print(f"Can't find {model} in list available models")
             return None
         
-        self.client = OpenAI(api_key=api_key)
+        # client and tokenizer are heavy, create them on first use
+        self.api_key = api_key
+        self._client = None
+        self._client_transport = None
+        self._enc = None
         self.model = model
         self.temperature = temperature
-        self.enc = tiktoken.encoding_for_model("gpt-4")
         self.max_input_token_count = max_input_token_count if max_input_token_count else gpt_models[model]
         self.total_in_tokens = 0
         self.total_out_tokens = 0
+        # input tokens served from provider prompt cache, reported by API
+        self.total_cached_tokens = 0
+        # process_json can be called from several threads at once
+        self.lock = threading.RLock()
+        # optional in-memory `ResponseCache`, used by long-lived daemon
+        self.cache = None
+        self.rate_limiter = RateLimiter(requests_per_minute) if requests_per_minute else None
+        # concurrent requests inside one `process_json` call
+        self.max_workers = 1
+        # optional `AdaptiveChunker`, sizes chunks by measured latency instead of token limit only
+        self.chunker = None
+        # stream responses and keep completed entries if response is cut off
+        self.stream = False
+        # optional `Hedger`, duplicates requests slower than latency percentile
+        self.hedger = None
+        # optional `Cassette`, records responses or replays them without network
+        self.cassette = None
+        # optional `Budget`, no requests are sent after spending limit is reached
+        self.budget = None
+        # optional `response_schema(json_input)`, returns strict JSON schema of the answer for structured outputs
+        self.response_schema = None
+        # move comments repeated in a chunk to a shared table of the request
+        self.hoist_comments = False
+        # optional `SharedTransport`, HTTP connection pool shared by clients of all models
+        self.transport = None
 
-    def process_json(self, prompt: str, json_input: dict):
-        if len(json_input) == 0: return dict()
+    @property
+    def client(self):
+        with self.lock:
+            # daemon may reuse the wrapper with another transport
+            if self._client is None or self._client_transport is not self.transport:
+                from openai import OpenAI
+                if self.transport:
+                    self._client = OpenAI(api_key=self.api_key, http_client=self.transport.client)
+                else:
+                    self._client = OpenAI(api_key=self.api_key)
+                self._client_transport = self.transport
+            return self._client
+
+    @property
+    def enc(self):
+        with self.lock:
+            if self._enc is None:
+                self._enc = load_encoding()
+            return self._enc
+
+    def reset_usage(self):
+        with self.lock:
+            self.total_in_tokens = 0
+            self.total_out_tokens = 0
+            self.total_cached_tokens = 0
+
+    def count_tokens(self, text: str) -> int:
+        with PROFILER.stage("tokenize"):
+            return len(self.enc.encode(text))
+
+    def split_json(self, prompt: str, json_input: dict, chunk_prompt = None):
+        """Split input into chunks, to fit max token limit.
+        `chunk_prompt(chunk)` can add chunk specific text to the prompt.
+        """
+        token_limit = self.max_input_token_count
+        if isinstance(self.enc, ApproximateEncoding):
+            token_limit = int(token_limit * self.enc.limit_share)
         splitted_jsons = [json_input]
         idx = 0
-        # split input into chunks, to fit max token limit
         while idx < len(splitted_jsons):
             val = splitted_jsons[idx]
-            message = json.dumps(val, ensure_ascii=False, separators=(',', ':'))
-            tokens_count = len(self.enc.encode(f"{prompt}\n{message}"))
-            if tokens_count > self.max_input_token_count:
+            payload, prompt_suffix = self.hoisted_payload(val)
+            message = json_io.dumps_compact(payload)
+            val_prompt = prompt + chunk_prompt(val) if chunk_prompt else prompt
+            val_prompt += prompt_suffix
+            tokens_count = self.count_tokens(f"{val_prompt}\n{message}")
+            if tokens_count > token_limit:
                 if len(val) < 2: 
-                    print(f"Not enought input tokens: {self.max_input_token_count}")
+                    print(f"Not enought input tokens: {token_limit}")
                     return None
                 val1, val2 = split_dictionary_by_half(val)
                 splitted_jsons[idx] = val1
                 splitted_jsons.insert(idx+1, val2)
             else:
                 idx += 1
+        return splitted_jsons
 
-        result_json = dict()
-        pbar = tqdm(splitted_jsons, leave=False)
-        translated_count = 0
-        for json_val in pbar:
-            message = json.dumps(json_val, ensure_ascii=False, separators=(',', ':'))
-            tokens_count = len(self.enc.encode(f"{prompt}\n{message}"))
+    def hoisted_payload(self, payload: dict):
+        """Returns (payload, prompt suffix). With `hoist_comments` repeated comments are moved to a table,
+        if it makes the request shorter together with the prompt explaining the table
+        """
+        if self.hoist_comments:
+            hoisted = hoist_comments(payload)
+            if COMMENTS_KEY in hoisted and \
+               len(json_io.dumps_compact(hoisted)) + len(COMMENTS_PROMPT) < len(json_io.dumps_compact(payload)):
+                return hoisted, COMMENTS_PROMPT
+        return payload, ""
+
+    def messages(self, prompt: str, json_input: dict, instruction = None) -> list:
+        """Request messages. With `instruction`, `null` slots are removed from the input and the instruction goes last,
+        so requests with the same prompt and source texts share a prefix for provider prompt caching
+        """
+        if instruction is None:
+            payload, prompt_suffix = self.hoisted_payload(json_input)
+            prompt += prompt_suffix
+            return [
+                {"role": "system", "content": prompt},
+                {"role": "user", "content": json_io.dumps_compact(payload)}
+            ]
+        payload = {key: {lang: val for (lang, val) in entry.items() if val is not None} if isinstance(entry, dict) else entry
+                   for (key, entry) in json_input.items()}
+        payload, prompt_suffix = self.hoisted_payload(payload)
+        prompt += prompt_suffix
+        return [
+            {"role": "system", "content": prompt},
+            {"role": "user", "content": json_io.dumps_compact(payload)},
+            {"role": "user", "content": instruction}
+        ]
+
+    def process_chunk(self, prompt: str, json_val: dict, on_entry = None, instruction = None):
+        """Translate one chunk from `split_json`, safe to call from several threads.
+        In stream mode `on_entry(key, value)` is called for every entry as soon as it is received.
+        Returns None if the request is skipped because the budget is exhausted.
+        """
+        messages = self.messages(prompt, json_val, instruction)
+        tokens_count = self.count_tokens("\n".join(message["content"] for message in messages))
+        planned_out_tokens = self.chunk_output_tokens(json_val) if self.budget or self.hedger else 0
+        if self.budget:
+            if not self.budget.reserve(self.model, tokens_count, planned_out_tokens):
+                return None # entries stay untranslated
+        with self.lock:
             self.total_in_tokens += tokens_count
-            translated_count += len(json_val)
-            pbar.set_description_str(f"Translating {translated_count}/{len(json_input)}, tokens count: in {self.total_in_tokens} / out {self.total_out_tokens}")
-            data = self.__process_json_internal(prompt, json_val)
-            result_json = {**result_json, **data}
-            # import time # just for debug
-            # time.sleep(2)
-            # result_json = {**result_json, **json_val}
+        try:
+            if self.hedger:
+                def on_hedge():
+                    with self.lock:
+                        self.total_in_tokens += tokens_count
+                    if self.budget:
+                        self.budget.spend(self.model, tokens_count, 0)
+                return self.hedger.run(lambda attempt: self.__process_json_internal(prompt, json_val, on_entry, instruction, attempt),
+                                       on_hedge, planned_out_tokens)
+            return self.__process_json_internal(prompt, json_val, on_entry, instruction)
+        finally:
+            if self.budget:
+                self.budget.release(self.model, planned_out_tokens)
+
+    def estimate_output_tokens(self, value) -> int:
+        """Rough output size of one entry: source text for every `null` slot"""
+        if not isinstance(value, dict):
+            return self.count_tokens(json_io.dumps_compact(value))
+        empty_count = sum(1 for val in value.values() if val is None)
+        source = next((val for (key, val) in value.items() if val is not None and key != "comment"), "")
+        return (self.count_tokens(json_io.dumps_compact(source)) + 4) * max(empty_count, 1)
+
+    def chunk_output_tokens(self, json_input: dict) -> int:
+        return sum(self.estimate_output_tokens(val) for val in json_input.values())
+
+    def __adaptive_chunks(self, prompt: str, json_input: dict, chunk_prompt = None, in_flight_tokens = None):
+        """Yields chunks sized by `self.chunker`, estimates are updated while requests finish.
+        `in_flight_tokens` returns estimated output tokens of chunks which are being requested
+        """
+        items = list(json_input.items())
+        estimates = [self.estimate_output_tokens(val) for (_, val) in items]
+        remaining_tokens = sum(estimates)
+        idx = 0
+        while idx < len(items):
+            target = self.chunker.target_output_tokens(remaining_tokens, self.max_workers, in_flight_tokens() if in_flight_tokens else 0)
+            start, chunk_tokens = idx, 0
+            while idx < len(items) and (idx == start or chunk_tokens + estimates[idx] <= target):
+                chunk_tokens += estimates[idx]
+                idx += 1
+            remaining_tokens -= chunk_tokens
+            # token limit is still respected
+            parts = self.split_json(prompt, dict(items[start:idx]), chunk_prompt)
+            if parts is None: return
+            yield from parts
+
+    def process_json(self, prompt: str, json_input: dict, chunk_prompt = None, on_entry = None, instruction = None, chunks = None):
+        """With `instruction`, chunk specific text from `chunk_prompt` is added to the instruction instead of the prompt.
+        `chunks` of `json_input` can be planned in advance with `split_json`.
+        """
+        if len(json_input) == 0: return dict()
+        count_prompt = prompt if instruction is None else f"{prompt}\n{instruction}"
+        in_flight = dict() # future: (entries count, estimated output tokens)
+        if chunks is None and self.chunker:
+            chunks = self.__adaptive_chunks(count_prompt, json_input, chunk_prompt,
+                                            lambda: sum(tokens for (_, tokens) in in_flight.values()))
+        elif chunks is None:
+            chunks = self.split_json(count_prompt, json_input, chunk_prompt)
+            if chunks is None: return None
 
+        import concurrent.futures
+        from tqdm.auto import tqdm
+        result_json = dict()
+        pbar = tqdm(total=len(json_input), leave=False)
+        chunks = iter(chunks)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                # next chunks are planned only when a worker is free, to use fresh latency estimates
+                for json_val in chunks:
+                    extra_prompt = chunk_prompt(json_val) if chunk_prompt else ""
+                    if instruction is None:
+                        future = executor.submit(self.process_chunk, prompt + extra_prompt, json_val, on_entry)
+                    else:
+                        future = executor.submit(self.process_chunk, prompt, json_val, on_entry, instruction + extra_prompt)
+                    in_flight[future] = (len(json_val), self.chunk_output_tokens(json_val) if self.chunker else 0)
+                    if len(in_flight) >= self.max_workers: break
+                if not in_flight: break
+                done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    result_json = {**result_json, **(future.result() or dict())}
+                    pbar.update(in_flight.pop(future)[0])
+                pbar.set_description_str(f"Translating {pbar.n}/{len(json_input)}, tokens count: in {self.total_in_tokens} / out {self.total_out_tokens}")
+        pbar.close()
         return result_json
 
 
-    def __process_json_internal(self, prompt, json_input):
-        message = json.dumps(json_input, ensure_ascii=False, separators=(',', ':'))
-        response = self.client.chat.completions.create(
-            model = self.model,
-            temperature = self.temperature,
-            response_format = { "type": "json_object" },
-            messages = [
-                {"role": "system", "content": prompt},
-                {"role": "user", "content": message}
-            ]
-        )
-        output_text = response.choices[0].message.content
+    def response_format(self, json_input: dict) -> dict:
+        if self.response_schema and self.model in structured_output_models:
+            schema = self.response_schema(json_input)
+            if schema is not None:
+                return {"type": "json_schema", "json_schema": {"name": "translations", "strict": True, "schema": schema}}
+        return {"type": "json_object"}
+
+    def __add_cached_tokens(self, usage):
+        details = getattr(usage, "prompt_tokens_details", None) if usage else None
+        cached_tokens = getattr(details, "cached_tokens", None) or 0
+        with self.lock:
+            self.total_cached_tokens += cached_tokens
+
+    def __request_streamed(self, messages, response_format, on_entry = None, attempt = None):
+        """Returns (output text, completed entries, is response complete).
+        Stream is closed as soon as hedged `attempt` lost
+        """
+        parser = IncrementalObjectParser()
+        result = dict()
+        output_parts = []
+        finish_reason = None
+        try:
+            stream = self.client.chat.completions.create(
+                model = self.model,
+                temperature = self.temperature,
+                response_format = response_format,
+                stream = True,
+                stream_options = {"include_usage": True},
+                messages = messages
+            )
+            for chunk in stream:
+                if attempt and attempt.lost():
+                    if hasattr(stream, "close"): stream.close()
+                    break
+                if getattr(chunk, "usage", None):
+                    self.__add_cached_tokens(chunk.usage)
+                if not chunk.choices: continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    output_parts.append(delta)
+                    for (key, value) in parser.feed(delta):
+                        result[key] = value
+                        if on_entry: on_entry(key, value)
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+        except Exception as e:
+            if not result: raise
+            print(f"Response stream was interrupted: {e}")
+        complete = parser.done and finish_reason in (None, "stop")
+        return "".join(output_parts), result, complete
+
+    def __process_json_internal(self, prompt, json_input, on_entry = None, instruction = None, attempt = None):
+        """With hedged `attempt` returns None without side effects if the other request won"""
+        messages = self.messages(prompt, json_input, instruction)
+        cache_key = (self.model, self.temperature, json_io.dumps_compact(messages))
+        cached = self.cache.get(cache_key) if self.cache is not None else None
+        if cached is not None:
+            return json_io.loads(cached)
+        if self.rate_limiter:
+            self.rate_limiter.wait()
+        start_time = time.monotonic()
+        if self.cassette:
+            request_prompt = prompt if instruction is None else f"{prompt}\n{instruction}"
+            cassette_key = self.cassette.request_key(self.model, self.temperature, request_prompt, json_input)
+        if self.cassette and self.cassette.replay:
+            entry = self.cassette.play(cassette_key)
+            output_text, result, complete = entry["output"], entry["result"], entry["complete"]
+        elif self.stream:
+            with PROFILER.stage("network"):
+                output_text, result, complete = self.__request_streamed(messages, self.response_format(json_input), on_entry, attempt)
+        else:
+            with PROFILER.stage("network"):
+                response = self.client.chat.completions.create(
+                    model = self.model,
+                    temperature = self.temperature,
+                    response_format = self.response_format(json_input),
+                    messages = messages
+                )
+            self.__add_cached_tokens(getattr(response, "usage", None))
+            output_text = response.choices[0].message.content
+            with PROFILER.stage("parse"):
+                result = json_io.loads(output_text)
+            complete = True
+        if attempt and not attempt.commit():
+            return None # response of the other hedged request is used
+        if self.cassette and self.cassette.replay and on_entry:
+            for (key, val) in result.items():
+                on_entry(key, val)
+        if self.cassette and not self.cassette.replay:
+            request = {"model": self.model, "temperature": self.temperature, "prompt": request_prompt, "input": json_input}
+            self.cassette.record(cassette_key, request, output_text, result, complete, time.monotonic() - start_time)
         # print("Output Tokens:", len(enc.encode(output_text)))
-        self.total_out_tokens += len(self.enc.encode(output_text))
-        return json.loads(output_text)
\ No newline at end of file
+        out_tokens = self.count_tokens(output_text)
+        with self.lock:
+            self.total_out_tokens += out_tokens
+        if self.budget:
+            self.budget.spend(self.model, 0, out_tokens)
+        if self.chunker:
+            self.chunker.observe(time.monotonic() - start_time, out_tokens)
+        if complete:
+            if self.cache is not None:
+                self.cache[cache_key] = output_text
+            return result
+
+        # response was cut off, request only entries we didn't get
+        remainder = {key: val for (key, val) in json_input.items() if key not in result}
+        if not remainder:
+            return result
+        if result:
+            print(f"Response was cut off, requesting {len(remainder)} remaining entries")
+            parts = [remainder]
+        elif len(remainder) > 1:
+            # nothing was received, halves have shorter responses
+            print(f"Response was cut off before the first entry, requesting {len(remainder)} entries in two parts")
+            parts = split_dictionary_by_half(remainder)
+        else:
+            raise ValueError("Response was cut off before the first entry")
+        for part in parts:
+            result.update(self.process_chunk(prompt, part, on_entry, instruction) or dict())
+        return result
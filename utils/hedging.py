@@ -0,0 +1,115 @@
+import threading, time
+import concurrent.futures
+
+class HedgedAttempt:
+    """One of the requests sent for the same input. Only the attempt which commits first keeps its side effects
+    (token counts, spend, cache, recording), `lost()` tells the other one to stop and drop its response
+    """
+    def __init__(self, race):
+        self.race = race
+
+    def commit(self) -> bool:
+        with self.race.lock:
+            if self.race.winner is None:
+                self.race.winner = self
+            return self.race.winner is self
+
+    def lost(self) -> bool:
+        with self.race.lock:
+            return self.race.winner is not None and self.race.winner is not self
+
+class HedgedRace:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.winner = None
+
+class Hedger:
+    """Sends a duplicate of a request, which takes longer than observed latency percentile.
+    Latency is measured per estimated output token, so chunks of different size share the statistics.
+    First committed response wins, the other one is dropped. A streamed response is closed,
+    a plain one can't be stopped and its output tokens are billed by the provider, but not counted.
+    """
+    def __init__(self, percentile: float = 95, max_ratio: float = 0.1, min_samples: int = 5):
+        self.percentile = percentile
+        self.max_ratio = max_ratio # max duplicates per request, limits extra spend
+        self.min_samples = min_samples
+        self.latencies = [] # seconds per output token
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.lock = threading.Lock()
+        self.executor = None
+
+    def seconds_per_token(self):
+        with self.lock:
+            if len(self.latencies) < self.min_samples: return None
+            latencies = sorted(self.latencies)
+        idx = min(int(len(latencies) * self.percentile / 100), len(latencies) - 1)
+        return latencies[idx]
+
+    def threshold(self, output_tokens: int):
+        seconds_per_token = self.seconds_per_token()
+        return seconds_per_token * max(output_tokens, 1) if seconds_per_token is not None else None
+
+    def __take_budget(self) -> bool:
+        with self.lock:
+            if self.hedged + 1 > self.max_ratio * self.requests: return False
+            self.hedged += 1
+            return True
+
+    def __timed(self, request, attempt, output_tokens: int):
+        start_time = time.monotonic()
+        result = request(attempt)
+        if not attempt.lost():
+            with self.lock:
+                self.latencies = (self.latencies + [(time.monotonic() - start_time) / max(output_tokens, 1)])[-200:]
+        return result
+
+    def run(self, request, on_hedge = None, output_tokens: int = 1):
+        """Calls `request(attempt)`, and once more in parallel if it's too slow for `output_tokens`.
+        `request` must call `attempt.commit()` before its side effects and skip them if it returns False.
+        `on_hedge()` is called for a duplicate
+        """
+        with self.lock:
+            self.requests += 1
+            if self.executor is None:
+                self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=64)
+        race = HedgedRace()
+        primary_attempt = HedgedAttempt(race)
+        primary = self.executor.submit(self.__timed, request, primary_attempt, output_tokens)
+        threshold = self.threshold(output_tokens)
+        if threshold is None:
+            return primary.result()
+        try:
+            return primary.result(timeout=threshold)
+        except concurrent.futures.TimeoutError:
+            pass
+        if not self.__take_budget():
+            return primary.result()
+
+        if on_hedge: on_hedge()
+        duplicate_attempt = HedgedAttempt(race)
+        duplicate = self.executor.submit(self.__timed, request, duplicate_attempt, output_tokens)
+        attempts = {primary: primary_attempt, duplicate: duplicate_attempt}
+        pending = set(attempts)
+        error = None
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                # response without side effects, like a cached one, commits here
+                if not attempts[future].commit(): continue
+                if future is duplicate:
+                    with self.lock:
+                        self.hedge_wins += 1
+                return future.result()
+        raise error
+
+    def description(self) -> str:
+        rate = self.hedged / self.requests * 100 if self.requests else 0
+        seconds_per_token = self.seconds_per_token()
+        threshold_text = f"{seconds_per_token * 1000:.1f}ms per output token" if seconds_per_token is not None else "not measured"
+        return (f"hedged {self.hedged} of {self.requests} requests ({rate:.1f}%), duplicate won {self.hedge_wins} times, "
+                f"p{self.percentile:g} latency {threshold_text}")
@@ -0,0 +1,73 @@
+import json, re
+
+# `orjson` is optional, stdlib `json` is used when it's not installed or can't encode the data
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson formats floats differently from stdlib
+OBJECT_FLOAT_RE = re.compile(r': -?\d+[.eE]')
+ARRAY_FLOAT_RE = re.compile(r'\n *-?\d+[.eE]')
+# a string which starts with `: `, its opening quote looks like a key separator
+LINE_START_SEPARATOR_RE = re.compile(r'\n *": ')
+# some orjson versions parse integers wider than 64 bit as float instead of failing,
+# 20 digits in a row (fast check with all digits replaced by zero) may be such integer
+DIGITS_TO_ZERO = bytes.maketrans(b"123456789", b"000000000")
+BIG_INT_DIGITS = b"0" * 20
+
+def may_have_big_int(text) -> bool:
+    data = text if isinstance(text, bytes) else text.encode("utf-8")
+    return BIG_INT_DIGITS in data.translate(DIGITS_TO_ZERO)
+
+def is_xcode_convertible(text: str) -> bool:
+    """Checks that orjson output becomes identical to stdlib by replacing `": ` with `" : `.
+    Quotes inside strings are always escaped, so unescaped closing quote with `: ` is a key separator.
+    Checks may also match text inside strings, it only means stdlib is used.
+    """
+    if not text or text[0] not in "{[": return False # scalars are fast in stdlib anyway
+    if '\\": ' in text or '": ": ' in text: return False
+    if LINE_START_SEPARATOR_RE.search(text) or OBJECT_FLOAT_RE.search(text): return False
+    # slower check, xcstrings files usually don't have arrays at all
+    if "[" in text and ARRAY_FLOAT_RE.search(text): return False
+    return True
+
+def loads(text):
+    if orjson and not may_have_big_int(text):
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass # let stdlib decide
+    return json.loads(text)
+
+def load(path: str):
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+def dumps_compact(data) -> str:
+    """Compact JSON of requests and cache keys, like json.dumps(data, ensure_ascii=False, separators=(',', ':')).
+    With orjson floats may be formatted differently (`1e19` instead of `1e+19`), parsed values are the same
+    """
+    if orjson:
+        try:
+            return orjson.dumps(data).decode("utf-8")
+        except TypeError:
+            pass
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+def dumps_xcode(data) -> str:
+    """Same as json.dumps(data, indent=2, ensure_ascii=False, separators=(',', ' : '), sort_keys=True),
+    which gives identical to Xcode formatting of `xcstrings` files
+    """
+    if orjson:
+        try:
+            text = orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS).decode("utf-8")
+            if is_xcode_convertible(text):
+                return text.replace('": ', '" : ')
+        except TypeError:
+            pass
+    return json.dumps(data,
+                      indent=2,
+                      ensure_ascii=False,
+                      separators=(',', ' : '),
+                      sort_keys=True)
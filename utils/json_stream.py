@@ -0,0 +1,67 @@
+import json
+
+WHITESPACE = " \t\n\r"
+
+class IncrementalObjectParser:
+    """Parses top level JSON object while text arrives, returns every key/value pair as soon as it is complete"""
+    def __init__(self):
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.started = False
+        self.done = False
+
+    def __skip_whitespace(self, pos: int) -> int:
+        while pos < len(self.buffer) and self.buffer[pos] in WHITESPACE:
+            pos += 1
+        return pos
+
+    def __decode(self, pos: int):
+        """Returns (value, end) or None if value is not complete yet"""
+        try:
+            value, end = self.decoder.raw_decode(self.buffer, pos)
+        except json.JSONDecodeError as e:
+            rest = self.buffer[e.pos:]
+            if e.pos >= len(self.buffer) - 1 or "Unterminated" in e.msg or \
+                any(literal.startswith(rest) for literal in ("true", "false", "null")):
+                return None
+            raise ValueError(f"Invalid JSON at {e.pos}: {e.msg}")
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and \
+            (end == len(self.buffer) or self.buffer[end] in ".eE+-0123456789"):
+            return None # number can continue in the next piece
+        return value, end
+
+    def feed(self, text: str) -> list:
+        self.buffer += text
+        entries = []
+        while not self.done:
+            pos = self.__skip_whitespace(self.pos)
+            if pos >= len(self.buffer): break
+            if not self.started:
+                if self.buffer[pos] != "{":
+                    raise ValueError("JSON object expected")
+                self.started = True
+                self.pos = pos + 1
+                continue
+            if self.buffer[pos] == "}":
+                self.done = True
+                self.pos = pos + 1
+                break
+            if self.buffer[pos] == ",":
+                pos = self.__skip_whitespace(pos + 1)
+                if pos >= len(self.buffer): break
+            key = self.__decode(pos)
+            if key is None: break
+            key, pos = key
+            pos = self.__skip_whitespace(pos)
+            if pos >= len(self.buffer): break
+            if self.buffer[pos] != ":":
+                raise ValueError(f"Expected ':' at {pos}")
+            pos = self.__skip_whitespace(pos + 1)
+            if pos >= len(self.buffer): break
+            value = self.__decode(pos)
+            if value is None: break
+            value, pos = value
+            entries.append((key, value))
+            self.pos = pos
+        return entries
@@ -0,0 +1,103 @@
+import time, threading, functools
+from contextlib import contextmanager
+
+class Profiler:
+    """Wall and CPU time per pipeline stage. Stages can be nested, and are recorded per thread"""
+    def __init__(self):
+        self.enabled = False
+        self.stats = dict() # "stage;substage" -> [calls, wall, cpu]
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.cprofile = None
+        self.pstats_path = None
+        self.collapsed_path = None
+
+    def start(self, pstats_path = None, collapsed_path = None):
+        self.enabled = True
+        self.stats = dict()
+        self.pstats_path = pstats_path
+        self.collapsed_path = collapsed_path
+        if pstats_path:
+            import cProfile
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+
+    @contextmanager
+    def stage(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        stack.append(name)
+        path = ";".join(stack)
+        start_wall, start_cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - start_wall, time.thread_time() - start_cpu
+            stack.pop()
+            with self.lock:
+                record = self.stats.setdefault(path, [0, 0.0, 0.0])
+                record[0] += 1
+                record[1] += wall
+                record[2] += cpu
+
+    def __self_wall(self, path: str) -> float:
+        """Stage time without nested stages, used for collapsed stacks"""
+        children = sum(record[1] for (child, record) in self.stats.items()
+                       if child.startswith(path + ";") and child.count(";") == path.count(";") + 1)
+        return max(self.stats[path][1] - children, 0.0)
+
+    def finish(self):
+        if not self.enabled: return
+        self.enabled = False
+        if self.cprofile:
+            self.cprofile.disable()
+            self.cprofile.dump_stats(self.pstats_path)
+            print(f"cProfile stats saved to {self.pstats_path}")
+        if self.collapsed_path:
+            with open(self.collapsed_path, "w") as f:
+                for path in sorted(self.stats):
+                    f.write(f"{path} {int(self.__self_wall(path) * 1000)}\n")
+            print(f"Collapsed stacks (ms) saved to {self.collapsed_path}")
+
+        print("\nProfile:")
+        print(f"{'stage':<40}{'calls':>8}{'wall, s':>12}{'cpu, s':>12}")
+        for path in sorted(self.stats):
+            calls, wall, cpu = self.stats[path]
+            name = "  " * path.count(";") + path.split(";")[-1]
+            print(f"{name:<40}{calls:>8}{wall:>12.3f}{cpu:>12.3f}")
+
+PROFILER = Profiler()
+
+def add_profile_arguments(parser):
+    parser.add_argument('--profile',
+                        action='store_true',
+                        default=False,
+                        help='Print wall and CPU time of every pipeline stage')
+
+    parser.add_argument('--profile_pstats',
+                        type=str,
+                        default=None,
+                        help='Also save cProfile stats of the main thread to this file')
+
+    parser.add_argument('--profile_collapsed',
+                        type=str,
+                        default=None,
+                        help='Also save stages as flamegraph collapsed stacks (milliseconds) to this file')
+
+def start_profiling(args):
+    if args.profile or args.profile_pstats or args.profile_collapsed:
+        PROFILER.start(args.profile_pstats, args.profile_collapsed)
+
+def profiled(name: str):
+    """Decorator, records every function call as `name` stage"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with PROFILER.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,47 @@
+import re, threading
+
+# printf-style placeholders used in iOS strings: %@, %d, %1$@, %.2f, %lld...
+PLACEHOLDER_RE = re.compile(r"%(?:\d+\$)?[-+ 0#]*\d*(?:\.\d+)?(?:hh|h|ll|l|q|z|t|j)?[@dDiuUxXoOfeEgGcCsSpaAF]")
+
+class ModelRouter:
+    """Sends simple entries (short, no plurals, few placeholders) to a cheaper model, others stay on the main one"""
+    def __init__(self, simple_gpt, max_length: int = 40, max_placeholders: int = 1, comments_to_strong: bool = False):
+        self.simple_gpt = simple_gpt
+        self.max_length = max_length
+        self.max_placeholders = max_placeholders
+        self.comments_to_strong = comments_to_strong
+        self.simple_count = 0
+        self.strong_count = 0
+        self.lock = threading.Lock()
+
+    def is_simple(self, entry: dict) -> bool:
+        texts = [val for (key, val) in entry.items() if key != "comment" and val is not None]
+        if not texts or any(not isinstance(text, str) for text in texts):
+            return False # plurals need the strong model
+        if self.comments_to_strong and entry.get("comment"):
+            return False
+        text = max(texts, key=len)
+        return len(text) <= self.max_length and len(PLACEHOLDER_RE.findall(text)) <= self.max_placeholders
+
+    def split(self, json_input: dict):
+        """Returns (simple entries, strong entries)"""
+        simple, strong = dict(), dict()
+        for (key, entry) in json_input.items():
+            if isinstance(entry, dict) and self.is_simple(entry):
+                simple[key] = entry
+            else:
+                strong[key] = entry
+        with self.lock:
+            self.simple_count += len(simple)
+            self.strong_count += len(strong)
+        return simple, strong
+
+    def description(self) -> str:
+        return (f"entries with up to {self.max_length} characters and {self.max_placeholders} placeholders" +
+                (", without comment" if self.comments_to_strong else "") +
+                f" go to {self.simple_gpt.model}")
+
+    def report(self, strong_model: str) -> str:
+        return (f"Routing: {self.simple_count} entries -> {self.simple_gpt.model} "
+                f"(tokens in {self.simple_gpt.total_in_tokens} / out {self.simple_gpt.total_out_tokens}), "
+                f"{self.strong_count} entries -> {strong_model}")
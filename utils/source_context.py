@@ -0,0 +1,67 @@
+# (family, branch) of languages, closer source language gives better context for translation
+LANGUAGE_FAMILIES = {
+    "es": ("romance", "ibero"), "pt": ("romance", "ibero"), "ca": ("romance", "ibero"), "gl": ("romance", "ibero"),
+    "fr": ("romance", "gallo"), "it": ("romance", "italo"), "ro": ("romance", "balkan"),
+    "de": ("germanic", "west"), "nl": ("germanic", "west"), "en": ("germanic", "west"), "af": ("germanic", "west"),
+    "sv": ("germanic", "north"), "da": ("germanic", "north"), "nb": ("germanic", "north"), "no": ("germanic", "north"),
+    "nn": ("germanic", "north"), "is": ("germanic", "north"),
+    "ru": ("slavic", "east"), "uk": ("slavic", "east"), "be": ("slavic", "east"),
+    "pl": ("slavic", "west"), "cs": ("slavic", "west"), "sk": ("slavic", "west"),
+    "hr": ("slavic", "south"), "sr": ("slavic", "south"), "bs": ("slavic", "south"), "sl": ("slavic", "south"),
+    "bg": ("slavic", "south"), "mk": ("slavic", "south"),
+    "lt": ("baltic", "east"), "lv": ("baltic", "east"),
+    "fi": ("uralic", "finnic"), "et": ("uralic", "finnic"), "hu": ("uralic", "ugric"),
+    "hi": ("indic", "central"), "ur": ("indic", "central"), "bn": ("indic", "eastern"), "mr": ("indic", "southern"),
+    "gu": ("indic", "western"), "pa": ("indic", "northwestern"),
+    "ms": ("malay", "malay"), "id": ("malay", "malay"),
+    "ar": ("semitic", "central"), "he": ("semitic", "central"),
+    "zh": ("sinitic", "chinese"), "ja": ("japonic", "japanese"), "ko": ("koreanic", "korean"),
+}
+
+SOURCE_CONTEXT_POLICIES = ["all", "primary", "related"]
+
+def base_language(lang_code: str) -> str:
+    return lang_code.split("-")[0].split("_")[0]
+
+def relatedness(lang1: str, lang2: str) -> int:
+    """3 - same language (pt-PT and pt-BR), 2 - same branch, 1 - same family, 0 - not related"""
+    base1, base2 = base_language(lang1), base_language(lang2)
+    if base1 == base2: return 3
+    family1, family2 = LANGUAGE_FAMILIES.get(base1), LANGUAGE_FAMILIES.get(base2)
+    if family1 is None or family2 is None or family1[0] != family2[0]: return 0
+    return 2 if family1[1] == family2[1] else 1
+
+def parse_related_languages(text: str) -> dict:
+    """`pt-BR:es,uk:ru` -> {"pt-BR": "es", "uk": "ru"}"""
+    result = dict()
+    for pair in text.split(","):
+        if not pair.strip(): continue
+        dst_lang, src_lang = pair.split(":")
+        result[dst_lang.strip()] = src_lang.strip()
+    return result
+
+class SourceContext:
+    """Chooses which source languages are sent with entries for a target language:
+    `all` - every source language, `primary` - the first one,
+    `related` - the first one and the closest related, configured or of the same language family
+    """
+    def __init__(self, policy: str = "all", related: dict = None):
+        self.policy = policy
+        self.related = related or dict()
+
+    def languages(self, src_langs: list, dst_lang: str):
+        """Source languages for `dst_lang`, None means all of them"""
+        if self.policy == "all" or len(src_langs) < 2:
+            return None
+        primary = src_langs[0]
+        if self.policy == "primary":
+            return [primary]
+        configured = self.related.get(dst_lang, self.related.get(base_language(dst_lang)))
+        if configured in src_langs:
+            return [primary] if configured == primary else [primary, configured]
+        scored = [(relatedness(lang, dst_lang), lang) for lang in src_langs[1:]]
+        best_score, best_lang = max(scored, key=lambda x: x[0])
+        # related language only helps, if it's closer than the primary one
+        if best_score > 0 and best_score > relatedness(primary, dst_lang):
+            return [primary, best_lang]
+        return [primary]
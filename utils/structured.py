@@ -0,0 +1,80 @@
+# CLDR plural categories of cardinal numbers, languages not listed use ["one", "other"]
+PLURAL_CATEGORIES = {
+    "ar": ["zero", "one", "two", "few", "many", "other"],
+    "cy": ["zero", "one", "two", "few", "many", "other"],
+    "ga": ["one", "two", "few", "many", "other"],
+    "he": ["one", "two", "other"],
+    "sl": ["one", "two", "few", "other"],
+    "lv": ["zero", "one", "other"],
+    "ru": ["one", "few", "many", "other"],
+    "uk": ["one", "few", "many", "other"],
+    "be": ["one", "few", "many", "other"],
+    "pl": ["one", "few", "many", "other"],
+    "cs": ["one", "few", "many", "other"],
+    "sk": ["one", "few", "many", "other"],
+    "lt": ["one", "few", "many", "other"],
+    "hr": ["one", "few", "other"],
+    "sr": ["one", "few", "other"],
+    "bs": ["one", "few", "other"],
+    "ro": ["one", "few", "other"],
+    "fr": ["one", "many", "other"],
+    "es": ["one", "many", "other"],
+    "it": ["one", "many", "other"],
+    "pt": ["one", "many", "other"],
+    "ca": ["one", "many", "other"],
+    "ja": ["other"],
+    "zh": ["other"],
+    "ko": ["other"],
+    "th": ["other"],
+    "vi": ["other"],
+    "id": ["other"],
+    "ms": ["other"],
+    "my": ["other"],
+    "lo": ["other"],
+    "km": ["other"],
+}
+
+# OpenAI limits of strict schemas, bigger chunks are requested as plain JSON object
+MAX_SCHEMA_PROPERTIES = 5000
+MAX_SCHEMA_NAMES_LENGTH = 120000
+
+def plural_categories(lang_code: str) -> list:
+    """`pt-BR` uses `pt` rules, `zh-Hans` uses `zh`"""
+    if lang_code in PLURAL_CATEGORIES:
+        return PLURAL_CATEGORIES[lang_code]
+    return PLURAL_CATEGORIES.get(lang_code.split("-")[0].split("_")[0], ["one", "other"])
+
+def strict_object(properties: dict) -> dict:
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False,
+    }
+
+def translation_schema(json_input: dict):
+    """Strict JSON schema of the answer: every key with only its `null` languages,
+    plurals with categories of the target language. Returns None if schema is too big
+    """
+    properties = dict()
+    properties_count = 0
+    names_length = 0
+    for (key, entry) in json_input.items():
+        if not isinstance(entry, dict): return None
+        plural = any(isinstance(val, dict) for (lang, val) in entry.items() if lang != "comment")
+        langs = dict()
+        for (lang, val) in entry.items():
+            if lang == "comment" or val is not None: continue
+            if plural:
+                categories = plural_categories(lang)
+                langs[lang] = strict_object({category: {"type": "string"} for category in categories})
+                properties_count += len(categories)
+                names_length += sum(len(category) for category in categories)
+            else:
+                langs[lang] = {"type": "string"}
+        properties[key] = strict_object(langs)
+        properties_count += len(langs) + 1
+        names_length += sum(len(lang) for lang in langs) + len(key)
+    if properties_count > MAX_SCHEMA_PROPERTIES or names_length > MAX_SCHEMA_NAMES_LENGTH:
+        return None
+    return strict_object(properties)
@@ -0,0 +1,41 @@
+import os, argparse
+
+ENCODING_NAME = "cl100k_base" # same as tiktoken.encoding_for_model("gpt-4")
+# tiktoken keeps BPE files in temp dir by default, which is wiped in CI and sandboxes
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "ios_app_localizer", "tiktoken")
+
+class ApproximateEncoding:
+    """Fallback when BPE files can't be loaded offline. Tokens count is approximate: 3 bytes per token is above
+    the real count for Latin and Cyrillic text, but can be below it up to 2 times for scripts like Devanagari or Thai,
+    so only `limit_share` of the token limit is used for chunks
+    """
+    limit_share = 0.5
+
+    def encode(self, text: str) -> list:
+        return [0] * (len(text.encode("utf-8")) // 3 + 1)
+
+def load_encoding():
+    os.environ.setdefault("TIKTOKEN_CACHE_DIR", DEFAULT_CACHE_DIR)
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(ENCODING_NAME)
+    except Exception as e:
+        print(f"Warning: Could not load tokenizer, using approximate tokens count: {e}")
+        return ApproximateEncoding()
+
+def main():
+    parser = argparse.ArgumentParser(description='Download tokenizer files into cache, so next runs work offline.')
+    parser.add_argument('--cache_dir',
+                        type=str,
+                        default=os.environ.get("TIKTOKEN_CACHE_DIR", DEFAULT_CACHE_DIR),
+                        help='Tokenizer cache location, same as TIKTOKEN_CACHE_DIR env variable')
+    args = parser.parse_args()
+
+    os.makedirs(args.cache_dir, exist_ok=True)
+    os.environ["TIKTOKEN_CACHE_DIR"] = args.cache_dir
+    import tiktoken
+    tiktoken.get_encoding(ENCODING_NAME)
+    print(f"Tokenizer cached in {args.cache_dir}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+import threading, importlib.util
+
+class SharedTransport:
+    """HTTP client shared by API clients of all models, so connections are kept alive and reused
+    between requests, models and jobs of the daemon. Pool size follows the number of concurrent requests.
+    Counts opened connections to report how many requests reused one.
+    """
+    def __init__(self, max_connections: int, keepalive_seconds: float = 30.0, http2: bool = False,
+                 connect_timeout: float = 10.0, read_timeout: float = 600.0):
+        self.max_connections = max_connections
+        self.keepalive_seconds = keepalive_seconds
+        self.http2 = http2
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.requests = 0
+        self.connections = 0
+        self._client = None
+        self.lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self.lock:
+            if self._client is None:
+                import httpx
+                self._client = httpx.Client(
+                    limits=httpx.Limits(max_connections=self.max_connections,
+                                        max_keepalive_connections=self.max_connections,
+                                        keepalive_expiry=self.keepalive_seconds),
+                    # read timeout is also used for writing and waiting for a free connection
+                    timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                    http2=self.http2,
+                    event_hooks={"request": [self.__on_request]},
+                )
+            return self._client
+
+    def __on_request(self, request):
+        prev_trace = request.extensions.get("trace")
+        def trace(event_name, info):
+            if event_name in ("connection.connect_tcp.complete", "connection.connect_unix_socket.complete"):
+                with self.lock:
+                    self.connections += 1
+            if prev_trace:
+                prev_trace(event_name, info)
+        request.extensions["trace"] = trace
+        with self.lock:
+            self.requests += 1
+
+    def description(self) -> str:
+        reused = max(self.requests - self.connections, 0)
+        ratio = reused / self.requests * 100 if self.requests else 0
+        protocol = "HTTP/2" if self.http2 else "HTTP/1.1"
+        return f"{self.requests} requests over {self.connections} connections ({protocol}, pool {self.max_connections}), {ratio:.0f}% reused"
+
+# one transport per settings for the whole process, daemon jobs keep connections of previous jobs
+_transports = dict()
+_transports_lock = threading.Lock()
+
+def shared_transport(max_connections: int, keepalive_seconds: float, http2: bool, connect_timeout: float, read_timeout: float) -> SharedTransport:
+    settings = (max_connections, keepalive_seconds, http2, connect_timeout, read_timeout)
+    with _transports_lock:
+        if settings not in _transports:
+            _transports[settings] = SharedTransport(*settings)
+        return _transports[settings]
+
+def add_transport_arguments(parser):
+    parser.add_argument('--shared_transport',
+                        action='store_true',
+                        default=False,
+                        help='Send all API requests through one tuned HTTP connection pool and report connection reuse')
+
+    parser.add_argument('--max_connections',
+                        type=int,
+                        default=None,
+                        help='Connection pool size of --shared_transport, default is number of concurrent requests')
+
+    parser.add_argument('--keepalive_seconds',
+                        type=float,
+                        default=30.0,
+                        help='Idle connections of --shared_transport are kept open this long (default: 30)')
+
+    parser.add_argument('--http2',
+                        action='store_true',
+                        default=False,
+                        help='Use HTTP/2 with --shared_transport, requires `h2` package')
+
+    parser.add_argument('--connect_timeout',
+                        type=float,
+                        default=10.0,
+                        help='Connect timeout of --shared_transport in seconds (default: 10)')
+
+    parser.add_argument('--read_timeout',
+                        type=float,
+                        default=600.0,
+                        help='Read, write and pool timeout of --shared_transport in seconds (default: 600)')
+
+def create_transport(args, concurrency: int):
+    """`concurrency` is the maximum number of requests in flight"""
+    if not args.shared_transport and not args.http2:
+        return None
+    http2 = args.http2
+    if http2 and importlib.util.find_spec("h2") is None:
+        print("HTTP/2 needs `pip install httpx[http2]`, HTTP/1.1 is used")
+        http2 = False
+    max_connections = args.max_connections or max(concurrency, 1)
+    return shared_transport(max_connections, args.keepalive_seconds, http2, args.connect_timeout, args.read_timeout)
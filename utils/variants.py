@@ -0,0 +1,81 @@
+from utils.source_context import parse_related_languages
+
+def adapt_prompt(base_name: str, variant_name: str, extra: str = "") -> str:
+    """Prompt of the adaptation pass, input and output JSON is `{key: text}`"""
+    return f"""Adapt texts of the iOS application from {base_name} to {variant_name}. Change only spelling, vocabulary and conventions that differ in {variant_name}, keep the meaning, text length, spacing and placeholders such as '%@' and '%d'.{extra} Output only keys that need changes, skip keys which are already correct. Example JSON input for English (United Kingdom):
+{{"color":"Color","ok":"OK"}}
+Output:
+{{"color":"Colour"}}
+"""
+
+def request_adaptation(gpt, prompt: str, entries: dict) -> dict:
+    """Sends `{key: text}` entries to the adaptation pass, answer has only changed keys"""
+    # strict schema requires every key, so answers are requested as plain JSON object
+    response_schema = gpt.response_schema
+    gpt.response_schema = None
+    try:
+        return gpt.process_json(prompt, entries) or dict()
+    finally:
+        gpt.response_schema = response_schema
+
+def merge_adapted(base_value, adapted):
+    """Adapted texts over the base value, empty texts are ignored and plural keeps categories of the base"""
+    def text_or(text, default):
+        return text if isinstance(text, str) and text.strip() else default
+    if isinstance(base_value, dict):
+        adapted = adapted if isinstance(adapted, dict) else dict()
+        return {category: text_or(adapted.get(category), text) for (category, text) in base_value.items()}
+    return text_or(adapted, base_value)
+
+class RegionalVariants:
+    """Regional variants derived from the translation of their base locale instead of the source:
+    `adapt` variants are sent to a cheap adaptation pass which returns only changed entries, `copy` variants get the base as is.
+    """
+    def __init__(self, adapt: dict = None, copy: dict = None):
+        self.adapt = adapt or dict()
+        self.copy = copy or dict()
+
+    def base(self, lang: str):
+        return self.adapt.get(lang, self.copy.get(lang))
+
+    def is_copy(self, lang: str) -> bool:
+        return lang in self.copy
+
+    def split(self, dst_langs: list, base_langs: list):
+        """Returns (languages to translate, variants to derive after them).
+        Variant is derived if its base is in `base_langs`: source languages or translated ones, or is a derived variant itself.
+        Variants are ordered after their bases, variants without available base are translated
+        """
+        available = set(base_langs)
+        variant_langs = []
+        pending = [lang for lang in dst_langs if self.base(lang) is not None]
+        while True:
+            ready = [lang for lang in pending if self.base(lang) in available and lang not in variant_langs]
+            if not ready: break
+            variant_langs += ready
+            available.update(ready)
+        return [lang for lang in dst_langs if lang not in variant_langs], variant_langs
+
+    def base_languages(self, src_langs: list, dst_langs: list) -> list:
+        return src_langs + [lang for lang in dst_langs if self.base(lang) is None]
+
+    def description(self) -> str:
+        pairs = [f"{lang} from {base}" for (lang, base) in self.adapt.items()] + \
+                [f"{lang} as {base}" for (lang, base) in self.copy.items()]
+        return ", ".join(pairs)
+
+def add_variant_arguments(parser):
+    parser.add_argument('--adapt_variants',
+                        type=str,
+                        default=None,
+                        help='Regional variants adapted from translation of their base locale, which returns only changed texts. Example: "pt-PT:pt-BR,en-GB:en-US,es-MX:es-ES"')
+
+    parser.add_argument('--copy_variants',
+                        type=str,
+                        default=None,
+                        help='Regional variants equivalent to their base locale, translation is copied. Example: "en-AU:en-GB"')
+
+def create_variants(args):
+    if not args.adapt_variants and not args.copy_variants:
+        return None
+    return RegionalVariants(parse_related_languages(args.adapt_variants or ""), parse_related_languages(args.copy_variants or ""))
@@ -0,0 +1,67 @@
+import os, time, threading
+
+def file_state(path: str):
+    try:
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        return None
+
+class FileWatcher:
+    """Reports changed files. Uses inotify through `watchdog` when installed, otherwise polls file states"""
+    def __init__(self, paths: list, interval: float = 1.0, debounce: float = 2.0):
+        self.paths = [os.path.abspath(p) for p in paths]
+        self.interval = interval
+        self.debounce = debounce
+        self.states = {path: file_state(path) for path in self.paths}
+        self.event = threading.Event()
+        self.observer = self.__start_observer()
+
+    def __start_observer(self):
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            return None
+
+        event = self.event
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, _):
+                event.set()
+
+        observer = Observer()
+        for directory in set(os.path.dirname(p) for p in self.paths):
+            observer.schedule(Handler(), directory, recursive=False)
+        observer.daemon = True
+        observer.start()
+        return observer
+
+    def mark_seen(self, path: str):
+        """Remember current state of the file (read or written by us), so it doesn't count as a change"""
+        self.states[os.path.abspath(path)] = file_state(path)
+
+    def changed_paths(self) -> list:
+        return [path for path in self.paths if file_state(path) != self.states[path]]
+
+    def wait_for_changes(self) -> list:
+        """Blocks until some files changed and stay untouched for `debounce` seconds"""
+        while True:
+            self.event.wait(self.interval)
+            self.event.clear()
+            if not self.changed_paths():
+                continue
+            # wait until Xcode (or anyone else) finishes writing
+            last_states = {path: file_state(path) for path in self.paths}
+            while True:
+                time.sleep(self.debounce)
+                states = {path: file_state(path) for path in self.paths}
+                if states == last_states:
+                    break
+                last_states = states
+            changed = self.changed_paths()
+            if changed:
+                return changed
+
+    def stop(self):
+        if self.observer:
+            self.observer.stop()
@@ -0,0 +1,99 @@
+import sqlite3, threading, time, json
+
+class WorkQueue:
+    """Persistent queue of translation requests in SQLite file, shared by worker processes on several machines.
+    Workers claim tasks with a lease, tasks of crashed workers are claimed again after their lease expires.
+    Failed task waits `retry_seconds` per attempt before it's claimed again, tasks with fewer attempts are claimed first.
+    """
+    def __init__(self, path: str, max_attempts: int = 3, retry_seconds: float = 30):
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self.lock = threading.Lock() # one connection is shared by worker threads
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY,
+            lang TEXT,
+            model TEXT,
+            prompt TEXT,
+            instruction TEXT,
+            payload TEXT,
+            status TEXT DEFAULT 'pending',
+            lease_owner TEXT,
+            lease_until REAL,
+            attempts INTEGER DEFAULT 0,
+            result TEXT)""")
+
+    def set_meta(self, key: str, value):
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                                    (key, json.dumps(value, ensure_ascii=False)))
+
+    def get_meta(self, key: str):
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def add_tasks(self, tasks: list):
+        """`tasks` is a list of (lang, model, prompt, instruction, chunk)"""
+        rows = [(lang, model, prompt, instruction, json.dumps(chunk, ensure_ascii=False)) for (lang, model, prompt, instruction, chunk) in tasks]
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.executemany("INSERT INTO tasks (lang, model, prompt, instruction, payload) VALUES (?, ?, ?, ?, ?)", rows)
+            self.connection.execute("COMMIT")
+
+    def claim(self, owner: str, lease_seconds: float):
+        """Returns (task id, model, prompt, instruction, chunk), or None if every pending task is leased now"""
+        with self.lock:
+            now = time.time()
+            # write lock is taken before select, so two workers can't claim the same task
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                # worker of the task crashed too many times, lease expired with attempts used up
+                self.connection.execute("""UPDATE tasks SET status = 'failed', lease_owner = NULL, lease_until = NULL
+                    WHERE status = 'pending' AND lease_until < ? AND attempts >= ?""", (now, self.max_attempts))
+                row = self.connection.execute("""SELECT id, model, prompt, instruction, payload FROM tasks
+                    WHERE status = 'pending' AND (lease_until IS NULL OR lease_until < ?)
+                    ORDER BY attempts, id LIMIT 1""", (now,)).fetchone()
+                if row:
+                    self.connection.execute("UPDATE tasks SET lease_owner = ?, lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                                            (owner, now + lease_seconds, row[0]))
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+        if row is None: return None
+        return row[0], row[1], row[2], row[3], json.loads(row[4])
+
+    def complete(self, task_id: int, result: dict):
+        # if lease expired and task was claimed again, the first result wins
+        with self.lock:
+            self.connection.execute("UPDATE tasks SET status = 'done', result = ?, lease_until = NULL WHERE id = ? AND status = 'pending'",
+                                    (json.dumps(result, ensure_ascii=False), task_id))
+
+    def release(self, task_id: int):
+        """Returns failed task to the queue after a delay, or marks it failed after `max_attempts`"""
+        with self.lock:
+            # lease of nobody keeps the task from being claimed again right away by the same worker
+            self.connection.execute("""UPDATE tasks SET lease_owner = NULL,
+                lease_until = CASE WHEN attempts >= ? THEN NULL ELSE ? + ? * attempts END,
+                status = CASE WHEN attempts >= ? THEN 'failed' ELSE status END
+                WHERE id = ? AND status = 'pending'""", (self.max_attempts, time.time(), self.retry_seconds, self.max_attempts, task_id))
+
+    def unclaim(self, task_id: int):
+        """Returns task to the queue without counting the attempt, when it wasn't sent"""
+        with self.lock:
+            self.connection.execute("""UPDATE tasks SET lease_owner = NULL, lease_until = NULL, attempts = attempts - 1
+                WHERE id = ? AND status = 'pending'""", (task_id,))
+
+    def counts(self) -> dict:
+        """Task count by status: pending, done, failed"""
+        with self.lock:
+            rows = self.connection.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall()
+        return {"pending": 0, "done": 0, "failed": 0, **dict(rows)}
+
+    def results(self) -> list:
+        """Returns (lang, result) of finished tasks"""
+        with self.lock:
+            rows = self.connection.execute("SELECT lang, result FROM tasks WHERE status = 'done' ORDER BY id").fetchall()
+        return [(lang, json.loads(result)) for (lang, result) in rows]